@@ -0,0 +1,161 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+# Axis-aligned box as (min_x, min_y, max_x, max_y)
+AABB = Tuple[float, float, float, float]
+
+def _union(a: AABB, b: AABB) -> AABB:
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+def _perimeter(box: AABB) -> float:
+    # Used as the surface-area cost in 2D
+    return 2.0 * ((box[2] - box[0]) + (box[3] - box[1]))
+
+def _contains(outer: AABB, inner: AABB) -> bool:
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+def _overlaps(a: AABB, b: AABB) -> bool:
+    # Touching edges count as overlapping
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+class _Node:
+    def __init__(self, box: AABB, obj: Any = None):
+        self.box = box
+        self.obj = obj
+        self.parent: Optional["_Node"] = None
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+
+    def is_leaf(self) -> bool:
+        return self.left is None
+
+class AABBTree:
+    # Dynamic bounding volume tree: leaves hold objects, internal nodes the union of their children.
+    # Leaf boxes are fattened by margin so objects that move a little don't need reinserting.
+    def __init__(self, margin: float = 0.0):
+        self.margin = margin
+        self._root: Optional[_Node] = None
+        self._leaves: Dict[Any, _Node] = {}
+
+    def __len__(self) -> int:
+        return len(self._leaves)
+
+    def __contains__(self, obj: Any) -> bool:
+        return obj in self._leaves
+
+    def _fatten(self, box: AABB) -> AABB:
+        m = self.margin
+        return (box[0] - m, box[1] - m, box[2] + m, box[3] + m)
+
+    def insert(self, obj: Any, box: AABB):
+        leaf = _Node(self._fatten(box), obj)
+        self._leaves[obj] = leaf
+        self._insert_leaf(leaf)
+
+    def remove(self, obj: Any):
+        leaf = self._leaves.pop(obj, None)
+        if leaf is not None:
+            self._remove_leaf(leaf)
+
+    def update(self, obj: Any, box: AABB) -> bool:
+        # Reinsert only once the object has left its fat box; returns True if it was moved.
+        # Objects not in the tree (e.g. already removed) are ignored rather than inserted
+        leaf = self._leaves.get(obj)
+        if leaf is None:
+            return False
+        if _contains(leaf.box, box):
+            return False
+        self._remove_leaf(leaf)
+        leaf.box = self._fatten(box)
+        self._insert_leaf(leaf)
+        return True
+
+    def clear(self):
+        self._root = None
+        self._leaves.clear()
+
+    def query(self, box: AABB) -> List[Any]:
+        # Objects whose (fat) box overlaps box; callers still do the exact test
+        found = []
+        if self._root is None:
+            return found
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if not _overlaps(node.box, box):
+                continue
+            if node.is_leaf():
+                found.append(node.obj)
+            else:
+                stack.append(node.left)
+                stack.append(node.right)
+        return found
+
+    def _insert_leaf(self, leaf: _Node):
+        if self._root is None:
+            self._root = leaf
+            leaf.parent = None
+            return
+        # Walk down picking the child whose box grows least (surface area heuristic)
+        box = leaf.box
+        node = self._root
+        while not node.is_leaf():
+            combined = _union(node.box, box)
+            combined_cost = _perimeter(combined)
+            # Cost of pairing the leaf with this node directly
+            cost = 2.0 * combined_cost
+            # Minimum cost pushed down to either child
+            inheritance = 2.0 * (combined_cost - _perimeter(node.box))
+            left_cost = self._descend_cost(node.left, box, inheritance)
+            right_cost = self._descend_cost(node.right, box, inheritance)
+            if cost < left_cost and cost < right_cost:
+                break
+            node = node.left if left_cost < right_cost else node.right
+        # Replace the chosen sibling with a new parent holding both
+        sibling = node
+        old_parent = sibling.parent
+        parent = _Node(_union(sibling.box, box))
+        parent.parent = old_parent
+        parent.left = sibling
+        parent.right = leaf
+        sibling.parent = parent
+        leaf.parent = parent
+        if old_parent is None:
+            self._root = parent
+        elif old_parent.left is sibling:
+            old_parent.left = parent
+        else:
+            old_parent.right = parent
+        self._refit(old_parent)
+
+    @staticmethod
+    def _descend_cost(child: _Node, box: AABB, inheritance: float) -> float:
+        grown = _perimeter(_union(child.box, box))
+        if child.is_leaf():
+            return grown + inheritance
+        return grown - _perimeter(child.box) + inheritance
+
+    def _remove_leaf(self, leaf: _Node):
+        if leaf is self._root:
+            self._root = None
+            return
+        # The sibling takes the parent's place
+        parent = leaf.parent
+        grandparent = parent.parent
+        sibling = parent.left if parent.right is leaf else parent.right
+        sibling.parent = grandparent
+        if grandparent is None:
+            self._root = sibling
+        else:
+            if grandparent.left is parent:
+                grandparent.left = sibling
+            else:
+                grandparent.right = sibling
+            self._refit(grandparent)
+        leaf.parent = None
+
+    @staticmethod
+    def _refit(node: Optional[_Node]):
+        # Recompute ancestor boxes up to the root
+        while node is not None:
+            node.box = _union(node.left.box, node.right.box)
+            node = node.parent
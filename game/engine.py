@@ -1,11 +1,37 @@
 import pygame
 import sys
 import os
+import math
+import numpy as np
 from typing import Dict, List, Optional, Tuple
 from .entities import Entity, Building, Unit
 from .resources import ResourceManager
-from .map import GameMap
+from .map import GameMap, Tile, TileType
 from .ui import UserInterface
+from .spatial import SpatialGrid
+from .broadphase import AABBTree
+from .kernels import melee_damage, step_towards
+
+# Isometric tile half-extents in world pixels
+_ISO_W, _ISO_H = 32, 16
+
+# Size of a spatial-grid cell in world pixels (4 tiles wide)
+GRID_CELL_SIZE = 128
+
+# Enemy units chase player units within this many world pixels
+AGGRO_RANGE = 400
+
+# Click radius around an entity in world pixels
+SELECTION_RADIUS = 20
+
+# Unit-vs-unit melee range in world pixels
+MELEE_RANGE = 30
+
+# Slack around unit boxes in the broad-phase tree, so a unit is only reinserted every few steps
+UNIT_TREE_MARGIN = 8
+
+def _is_player_unit(entity: Entity) -> bool:
+    return isinstance(entity, Unit) and entity.team == 'player'
 
 class GameEngine:
     def __init__(self, screen_width: int = 1280, screen_height: int = 720):
@@ -22,6 +48,9 @@ class GameEngine:
             pygame.display.set_caption("Medieval Kingdom")
             self.clock = pygame.time.Clock()
             
+            # Last known cursor position, kept up to date from mouse events
+            self._mouse_pos = pygame.mouse.get_pos()
+            
             # Initialize game state
             self.running = False
             self.paused = False
@@ -31,10 +60,26 @@ class GameEngine:
             self.entities: List[Entity] = []
             self.buildings: List[Building] = []
             self.units: List[Unit] = []
+            # Units split by team, kept in sync with self.units for the AI
+            self._player_units: List[Unit] = []
+            self._enemy_units: List[Unit] = []
+            
+            # Spatial index of entities by world position, used for hit-testing and AI
+            self._entity_grid = SpatialGrid(GRID_CELL_SIZE)
+            # Broad-phase trees for unit combat and collision; buildings never move,
+            # so their tree only changes when one is placed or destroyed
+            self._unit_tree = AABBTree(UNIT_TREE_MARGIN)
+            self._building_tree = AABBTree()
+            
+            # Unit world positions as a NumPy array, row i belongs to _unit_refs[i]
+            self._unit_pos = np.empty((0, 2), dtype=np.float32)
+            self._unit_refs: List[Unit] = []
             
             # Camera and zoom settings
             self.camera_x = 0
             self.camera_y = 0
+            self._cam_limits_key = None
+            self._cam_limits = (0, 0, 0, 0)
             self.zoom_level = 1.0
             self.MIN_ZOOM = 0.5
             self.MAX_ZOOM = 2.0
@@ -43,43 +88,35 @@ class GameEngine:
             # Game systems
             self.resource_manager = ResourceManager()
             self.game_map = GameMap(71, 71)  # Reduced map size to about half the number of tiles
-            self.ui = UserInterface(self.screen)
+            self.ui = UserInterface(self.screen, self.resource_manager)
             
             # Add Stonekeep at (9, 13)
             stonekeep = Building(9, 13, "Stonekeep")
-            self.entities.append(stonekeep)
-            self.buildings.append(stonekeep)
-            self.game_map.tiles[13][9].building = stonekeep
+            self.add_entity(stonekeep)
+            self._occupy_tile(stonekeep, 9, 13)
             # Add Stockpile immediately to the right of player's stonekeep, (11, 13) to (14, 13)
             stockpile_right = Building(11, 13, "Stockpile")
-            self.entities.append(stockpile_right)
-            self.buildings.append(stockpile_right)
-            for sx in range(11, 15):
-                if 0 <= sx < self.game_map.width:
-                    self.game_map.tiles[13][sx].building = stockpile_right
+            self.add_entity(stockpile_right)
+            self._stamp_building(stockpile_right, 11, 13)
             # Place two stone (mountain) resources 6 tiles away from the stonekeep (5 tiles further)
             for dx, dy in [(6, 0), (0, 6)]:
                 sx, sy = 9 + dx, 13 + dy
                 if 0 <= sx < self.game_map.width and 0 <= sy < self.game_map.height:
-                    self.game_map.tiles[sy][sx].tile_type = self.game_map.tiles[sy][sx].tile_type.__class__.MOUNTAIN
+                    self.game_map.set_tile_type(sx, sy, TileType.MOUNTAIN)
             # Place two stone (mountain) resources 6 tiles away from the enemy stonekeep at (65, 5)
             for dx, dy in [(6, 0), (0, 6)]:
                 ex, ey = 65 + dx, 5 + dy
                 if 0 <= ex < self.game_map.width and 0 <= ey < self.game_map.height:
-                    self.game_map.tiles[ey][ex].tile_type = self.game_map.tiles[ey][ex].tile_type.__class__.MOUNTAIN
+                    self.game_map.set_tile_type(ex, ey, TileType.MOUNTAIN)
 
             # Add enemy Stonekeep at (65, 5)
             enemy_stonekeep = Building(65, 5, "EnemyStonekeep")
-            self.entities.append(enemy_stonekeep)
-            self.buildings.append(enemy_stonekeep)
-            self.game_map.tiles[5][65].building = enemy_stonekeep
+            self.add_entity(enemy_stonekeep)
+            self._occupy_tile(enemy_stonekeep, 65, 5)
             # Add Stockpile immediately to the left of enemy stonekeep, (61, 5) to (64, 5)
             stockpile_enemy_left = Building(61, 5, "Stockpile")
-            self.entities.append(stockpile_enemy_left)
-            self.buildings.append(stockpile_enemy_left)
-            for sx in range(61, 65):
-                if 0 <= sx < self.game_map.width:
-                    self.game_map.tiles[5][sx].building = stockpile_enemy_left
+            self.add_entity(stockpile_enemy_left)
+            self._stamp_building(stockpile_enemy_left, 61, 5)
             # Spawn 5 enemy swordsmen near the enemy stonekeep
             # Place enemy units adjacent to the 2x2 enemy stonekeep at (65,5),(66,5),(65,6),(66,6)
             adjacent_offsets = [(-1,0), (2,0), (0,-1), (0,2), (2,2), (-1,2), (2,-1), (-1,-1)]
@@ -91,12 +128,11 @@ class GameEngine:
                     spawn_tiles.append((tx, ty))
             for i in range(5):
                 tx, ty = spawn_tiles[i % len(spawn_tiles)]
-                iso_x = (tx - ty) * 32
-                iso_y = (tx + ty) * 16
+                iso_x = (tx - ty) * _ISO_W
+                iso_y = (tx + ty) * _ISO_H
                 enemy_unit = Unit(iso_x, iso_y, "Swordsman", team="enemy")
-                self.entities.append(enemy_unit)
-                self.units.append(enemy_unit)
-                self.game_map.tiles[ty][tx].unit = enemy_unit
+                self.add_entity(enemy_unit)
+                self._occupy_tile(enemy_unit, tx, ty)
             
             # Calculate initial camera position to center the map
             self.center_camera()
@@ -109,269 +145,258 @@ class GameEngine:
             self.building_to_place = None
             self.placement_preview = None
 
-            # Win message state
+            # Win message state, surfaces are rendered once when the game is won
             self.win_message_shown = False
+            self._win_font = pygame.font.Font(None, 80)
+            self._win_surface = None
+            self._win_rect = None
+            self._win_overlay = None
             
         except Exception as e:
             print(f"Error initializing game engine: {e}")
             raise
 
     def center_camera(self):
-        try:
-            # Center on the middle tile of the map
-            center_tile_x = self.game_map.width // 2
-            center_tile_y = self.game_map.height // 2
-            center_tile = self.game_map.get_tile_at(center_tile_x, center_tile_y)
-            if center_tile:
-                points = center_tile.get_points(self.zoom_level)
-                center_x, center_y = points[0]  # Center of the tile
-                self.camera_x = (self.screen.get_width() // 2) - int(center_x)
-                self.camera_y = (self.screen.get_height() // 2) - int(center_y)
-        except Exception as e:
-            print(f"Error centering camera: {e}")
+        # Center on the middle tile of the map
+        center_tile_x = self.game_map.width // 2
+        center_tile_y = self.game_map.height // 2
+        center_tile = self.game_map.get_tile_at(center_tile_x, center_tile_y)
+        if center_tile:
+            points = center_tile.get_points(self.zoom_level)
+            center_x, center_y = points[0]  # Center of the tile
+            self.camera_x = (self.screen.get_width() // 2) - int(center_x)
+            self.camera_y = (self.screen.get_height() // 2) - int(center_y)
             
+    def add_entity(self, entity: Entity):
+        # Register a new entity with the game state and the spatial grid
+        self.entities.append(entity)
+        if isinstance(entity, Unit):
+            # The buildings list is only ever updated in place, so bind it once
+            entity.all_buildings = self.buildings
+            self.units.append(entity)
+            if entity.team == 'enemy':
+                self._enemy_units.append(entity)
+            else:
+                self._player_units.append(entity)
+            self._unit_refs.append(entity)
+            row = np.array([[entity.x, entity.y]], dtype=np.float32)
+            self._unit_pos = np.concatenate((self._unit_pos, row))
+            self._unit_tree.insert(entity, entity.get_aabb())
+        elif isinstance(entity, Building):
+            self.buildings.append(entity)
+            self._building_tree.insert(entity, entity.get_aabb())
+        world_x, world_y = entity.get_screen_pos(1.0)
+        self._entity_grid.insert(entity, world_x, world_y)
+
+    def _sync_unit_positions(self):
+        # Copy the current unit positions into the position array
+        if self._unit_refs:
+            self._unit_pos[:] = [(unit.x, unit.y) for unit in self._unit_refs]
+
+    def remove_entities(self, dead_entities: List[Entity]):
+        # Drop entities from every list in a single filtering pass each;
+        # slice assignment keeps the list objects that units hold references to
+        if not dead_entities:
+            return
+        dead = set(dead_entities)
+        self.entities[:] = [e for e in self.entities if e not in dead]
+        for entity in dead_entities:
+            entity.selected = False
+        self.selected_entities[:] = [e for e in self.selected_entities if e not in dead]
+        self.units[:] = [u for u in self.units if u not in dead]
+        self._player_units[:] = [u for u in self._player_units if u not in dead]
+        self._enemy_units[:] = [u for u in self._enemy_units if u not in dead]
+        self.buildings[:] = [b for b in self.buildings if b not in dead]
+        keep = np.array([u not in dead for u in self._unit_refs], dtype=bool)
+        if not keep.all():
+            self._unit_pos = self._unit_pos[keep]
+            self._unit_refs[:] = [u for u in self._unit_refs if u not in dead]
+        for entity in dead_entities:
+            if isinstance(entity, Building):
+                entity.stop_production()
+            self._entity_grid.remove(entity)
+            self._unit_tree.remove(entity)
+            self._building_tree.remove(entity)
+            # Remove from map tiles
+            self._release_tiles(entity)
+
+    def _occupy_tile(self, entity: Entity, tx: int, ty: int):
+        # Point the map tile at the entity and remember it for O(1) cleanup
+        tile = self.game_map.tiles[ty][tx]
+        if isinstance(entity, Unit):
+            tile.unit = entity
+        else:
+            tile.building = entity
+        entity._occupied_tiles.append((tx, ty))
+
+    def _stamp_building(self, building: Building, x: int, y: int):
+        # Occupy the building's whole tile footprint with its top-left corner at (x, y)
+        stamped = self.game_map.stamp_building(building, x, y, building.tile_w, building.tile_h)
+        building._occupied_tiles.extend(stamped)
+
+    def _release_tiles(self, entity: Entity):
+        for tx, ty in entity._occupied_tiles:
+            tile = self.game_map.tiles[ty][tx]
+            if tile.unit is entity:
+                tile.unit = None
+            if tile.building is entity:
+                tile.building = None
+        entity._occupied_tiles.clear()
+
+    def _entities_at(self, screen_pos: Tuple[int, int]) -> List[Entity]:
+        # Entities within the selection radius of a screen position
+        world_x = (screen_pos[0] - self.camera_x) / self.zoom_level
+        world_y = (screen_pos[1] - self.camera_y) / self.zoom_level
+        return self._entity_grid.query_radius(world_x, world_y, SELECTION_RADIUS)
+
     def get_camera_limits(self) -> Tuple[float, float, float, float]:
-        try:
-            # Calculate map boundaries in screen coordinates
-            map_width = self.game_map.width * 32 * self.zoom_level
-            map_height = self.game_map.height * 16 * self.zoom_level
-            screen_width, screen_height = self.screen.get_size()
-            
-            # Add padding to prevent empty space at edges
-            padding = 100
-            
-            # Calculate limits
-            min_x = screen_width - map_width - padding
-            max_x = padding
-            min_y = screen_height - map_height - padding
-            max_y = padding
-            
-            return min_x, max_x, min_y, max_y
-        except Exception as e:
-            print(f"Error calculating camera limits: {e}")
-            return 0, 0, 0, 0
+        # Limits only change with zoom level or screen size
+        screen_width, screen_height = self.screen.get_size()
+        key = (self.zoom_level, screen_width, screen_height)
+        if key == self._cam_limits_key:
+            return self._cam_limits
+        
+        # Calculate map boundaries in screen coordinates
+        map_width = self.game_map.width * 32 * self.zoom_level
+        map_height = self.game_map.height * 16 * self.zoom_level
+        
+        # Add padding to prevent empty space at edges
+        padding = 100
+        
+        # Calculate limits
+        min_x = screen_width - map_width - padding
+        max_x = padding
+        min_y = screen_height - map_height - padding
+        max_y = padding
+        
+        self._cam_limits_key = key
+        self._cam_limits = (min_x, max_x, min_y, max_y)
+        return self._cam_limits
             
     def clamp_camera_position(self):
-        try:
-            min_x, max_x, min_y, max_y = self.get_camera_limits()
-            
-            # Clamp camera position within limits
-            self.camera_x = max(min_x, min(max_x, self.camera_x))
-            self.camera_y = max(min_y, min(max_y, self.camera_y))
-        except Exception as e:
-            print(f"Error clamping camera position: {e}")
+        min_x, max_x, min_y, max_y = self.get_camera_limits()
+        
+        # Clamp camera position within limits
+        self.camera_x = max(min_x, min(max_x, self.camera_x))
+        self.camera_y = max(min_y, min(max_y, self.camera_y))
             
     def handle_events(self):
-        try:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
-                        self.paused = not self.paused
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    if event.button == 1:  # Left click
-                        # First, check if a UI button was clicked
-                        button_clicked = self.ui.handle_mouse(event.pos)
-                        if button_clicked:
-                            # Set placement mode according to button
-                            if button_clicked == "Swordsman":
-                                self.spawning_swordsman = True
-                                self.placement_preview = None
-                                self.building_to_place = None
-                            elif button_clicked in ("Woodcutter", "Quarry", "Farm", "Barracks", "Archery"):
-                                self.building_to_place = button_clicked
-                                # Create a preview building object here if needed
-                                # For now, just set a flag
-                                self.placement_preview = Building(0, 0, button_clicked)
-                                self.spawning_swordsman = False
-                            else:
-                                self.building_to_place = None
-                                self.placement_preview = None
-                                self.spawning_swordsman = False
-                            # Do NOT start drag-select if UI button was clicked
-                            continue
-                        # If in placement mode, handle as placement
-                        if (self.placement_preview and self.building_to_place) or getattr(self, 'spawning_swordsman', False):
-                            self.handle_mouse_click(event.pos, button=1)
-                        else:
-                            self.drag_selecting = True
-                            self.drag_start = event.pos
-                            self.drag_end = event.pos
-                    elif event.button == 3:  # Right click
-                        self.handle_mouse_click(event.pos, button=3)
-                elif event.type == pygame.MOUSEBUTTONUP:
-                    if event.button == 1 and self.drag_selecting:
-                        self.drag_end = event.pos
-                        self.handle_drag_select(self.drag_start, self.drag_end)
-                        self.drag_selecting = False
-                        self.drag_start = None
-                        self.drag_end = None
-                    elif event.button == 1:
-                        # Deselect all if not clicking a unit
-                        mouse_pos = event.pos
-                        clicked_unit = False
-                        for entity in self.entities:
-                            if isinstance(entity, Unit):
-                                screen_x, screen_y = entity.get_screen_pos(self.zoom_level)
-                                screen_x += self.camera_x
-                                screen_y += self.camera_y
-                                dx = mouse_pos[0] - screen_x
-                                dy = mouse_pos[1] - screen_y
-                                distance = (dx ** 2 + dy ** 2) ** 0.5
-                                if distance < 20 * self.zoom_level:
-                                    clicked_unit = True
-                                    break
-                        if not clicked_unit:
-                            for entity in self.selected_entities:
-                                entity.selected = False
-                            self.selected_entities.clear()
-                elif event.type == pygame.MOUSEMOTION:
-                    if getattr(self, 'drag_selecting', False):
-                        self.drag_end = pygame.mouse.get_pos()
-                elif event.type == pygame.MOUSEWHEEL:
-                    mouse_x, mouse_y = pygame.mouse.get_pos()
-                    if event.y > 0:
-                        self.zoom_in()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    self.paused = not self.paused
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                self._mouse_pos = event.pos
+                if event.button == 1:  # Left click
+                    # First, check if a UI button was clicked
+                    button_clicked = self.ui.handle_mouse(event.pos)
+                    if button_clicked:
+                        # Set placement mode according to button
+                        self.start_building_placement(button_clicked)
+                        # Do NOT start drag-select if UI button was clicked
+                        continue
+                    # If in placement mode, handle as placement
+                    if (self.placement_preview and self.building_to_place) or getattr(self, 'spawning_swordsman', False):
+                        self.handle_mouse_click(event.pos, button=1)
                     else:
-                        self.zoom_out()
-        except Exception as e:
-            print(f"Error handling events: {e}")
-        try:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
-                        self.paused = not self.paused
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    # Building placement mode: handle left/right click for placement/cancel
-                    if self.placement_preview and self.building_to_place:
-                        self.handle_mouse_click(event.pos, button=event.button)
-                        return
-                    if event.button == 1:  # Left click
                         self.drag_selecting = True
-                        self.drag_start = pygame.mouse.get_pos()
-                        self.drag_end = self.drag_start
-                        # Check UI buttons first
-                        ui_result = self.ui.handle_mouse(event.pos)
-                        if ui_result:
-                            self.start_building_placement(ui_result)
-                            return
-                        self.handle_mouse_click(event.pos)
-                    elif event.button == 3:  # Right click
-                        self.handle_mouse_click(event.pos, button=3)
-                    elif event.button == 4:  # Mouse wheel up
-                        self.zoom_in()
-                    elif event.button == 5:  # Mouse wheel down
-                        self.zoom_out()
-                elif event.type == pygame.MOUSEBUTTONUP:
-                    if event.button == 1 and getattr(self, 'drag_selecting', False):
-                        self.drag_end = pygame.mouse.get_pos()
-                        self.handle_drag_select(self.drag_start, self.drag_end)
-                        self.drag_selecting = False
-                elif event.type == pygame.MOUSEMOTION:
-                    if getattr(self, 'drag_selecting', False):
-                        self.drag_end = pygame.mouse.get_pos()
-                elif event.type == pygame.MOUSEWHEEL:
-                    mouse_x, mouse_y = pygame.mouse.get_pos()
-                    if event.y > 0:
-                        self.zoom_in()
-                    else:
-                        self.zoom_out()
-        except Exception as e:
-            print(f"Error handling events: {e}")
+                        self.drag_start = event.pos
+                        self.drag_end = event.pos
+                elif event.button == 3:  # Right click
+                    self.handle_mouse_click(event.pos, button=3)
+            elif event.type == pygame.MOUSEBUTTONUP:
+                self._mouse_pos = event.pos
+                if event.button == 1 and self.drag_selecting:
+                    self.drag_end = event.pos
+                    self.handle_drag_select(self.drag_start, self.drag_end)
+                    self.drag_selecting = False
+                    self.drag_start = None
+                    self.drag_end = None
+                elif event.button == 1:
+                    # Deselect all if not clicking a unit
+                    mouse_pos = event.pos
+                    clicked_unit = any(isinstance(entity, Unit) for entity in self._entities_at(mouse_pos))
+                    if not clicked_unit:
+                        for entity in self.selected_entities:
+                            entity.selected = False
+                        self.selected_entities.clear()
+            elif event.type == pygame.MOUSEMOTION:
+                self._mouse_pos = event.pos
+                if self.drag_selecting:
+                    self.drag_end = event.pos
+            elif event.type == pygame.MOUSEWHEEL:
+                if event.y > 0:
+                    self.zoom_in()
+                else:
+                    self.zoom_out()
+            elif event.type == pygame.VIDEORESIZE:
+                self.ui.handle_resize(event.size)
             
+    def _on_zoom_change(self):
+        # Sprite caches are keyed by zoom level; drop the old level's surfaces so zooming
+        # back and forth doesn't keep every level ever visited alive
+        Tile._surface_cache.clear()
+        Building._surface_cache.clear()
+        Unit._surface_cache.clear()
+        
     def zoom_in(self):
-        try:
-            if self.zoom_level < self.MAX_ZOOM:
-                # Store old zoom level
-                old_zoom = self.zoom_level
-                
-                # Increase zoom
-                self.zoom_level = min(self.zoom_level + self.ZOOM_SPEED, self.MAX_ZOOM)
-                
-                # Get mouse position
-                mouse_x, mouse_y = pygame.mouse.get_pos()
-                
-                # Calculate the world position under the mouse before zooming
-                world_x = (mouse_x - self.camera_x) / old_zoom
-                world_y = (mouse_y - self.camera_y) / old_zoom
-                
-                # Calculate new camera position to keep the world position under the mouse
-                self.camera_x = mouse_x - world_x * self.zoom_level
-                self.camera_y = mouse_y - world_y * self.zoom_level
-                
-                # Clamp camera position
-                self.clamp_camera_position()
-        except Exception as e:
-            print(f"Error zooming in: {e}")
+        if self.zoom_level < self.MAX_ZOOM:
+            # Store old zoom level
+            old_zoom = self.zoom_level
+            
+            # Increase zoom
+            self.zoom_level = min(self.zoom_level + self.ZOOM_SPEED, self.MAX_ZOOM)
+            
+            # Get mouse position
+            mouse_x, mouse_y = self._mouse_pos
+            
+            # Calculate the world position under the mouse before zooming
+            world_x = (mouse_x - self.camera_x) / old_zoom
+            world_y = (mouse_y - self.camera_y) / old_zoom
+            
+            # Calculate new camera position to keep the world position under the mouse
+            self.camera_x = mouse_x - world_x * self.zoom_level
+            self.camera_y = mouse_y - world_y * self.zoom_level
+            
+            # Clamp camera position
+            self.clamp_camera_position()
+            self._on_zoom_change()
             
     def zoom_out(self):
-        try:
-            if self.zoom_level > self.MIN_ZOOM:
-                # Store old zoom level
-                old_zoom = self.zoom_level
-                
-                # Decrease zoom
-                self.zoom_level = max(self.zoom_level - self.ZOOM_SPEED, self.MIN_ZOOM)
-                
-                # Get mouse position
-                mouse_x, mouse_y = pygame.mouse.get_pos()
-                
-                # Calculate the world position under the mouse before zooming
-                world_x = (mouse_x - self.camera_x) / old_zoom
-                world_y = (mouse_y - self.camera_y) / old_zoom
-                
-                # Calculate new camera position to keep the world position under the mouse
-                self.camera_x = mouse_x - world_x * self.zoom_level
-                self.camera_y = mouse_y - world_y * self.zoom_level
-                
-                # Clamp camera position
-                self.clamp_camera_position()
-        except Exception as e:
-            print(f"Error zooming out: {e}")
+        if self.zoom_level > self.MIN_ZOOM:
+            # Store old zoom level
+            old_zoom = self.zoom_level
             
-    def handle_drag_select(self, start: Tuple[int, int], end: Tuple[int, int]):
-        # Select all units within the drag rectangle
-        if not start or not end:
-            return
-        x1, y1 = start
-        x2, y2 = end
-        left, right = min(x1, x2), max(x1, x2)
-        top, bottom = min(y1, y2), max(y1, y2)
-        self.selected_entities.clear()
-        for entity in self.entities:
-            if isinstance(entity, Unit):
-                screen_x, screen_y = entity.get_screen_pos(self.zoom_level)
-                screen_x += self.camera_x
-                screen_y += self.camera_y
-                if left <= screen_x <= right and top <= screen_y <= bottom:
-                    self.selected_entities.append(entity)
-                    entity.selected = True
-                else:
-                    entity.selected = False
-
-    def get_formation_positions(self, center: Tuple[float, float], count: int, spacing: float = 40.0):
-        # Arrange positions in a grid centered at 'center'
-        import math
+            # Decrease zoom
+            self.zoom_level = max(self.zoom_level - self.ZOOM_SPEED, self.MIN_ZOOM)
+            
+            # Get mouse position
+            mouse_x, mouse_y = self._mouse_pos
+            
+            # Calculate the world position under the mouse before zooming
+            world_x = (mouse_x - self.camera_x) / old_zoom
+            world_y = (mouse_y - self.camera_y) / old_zoom
+            
+            # Calculate new camera position to keep the world position under the mouse
+            self.camera_x = mouse_x - world_x * self.zoom_level
+            self.camera_y = mouse_y - world_y * self.zoom_level
+            
+            # Clamp camera position
+            self.clamp_camera_position()
+            self._on_zoom_change()
+            
+    def get_formation_positions(self, center: Tuple[float, float], count: int, spacing: float = 40.0) -> List[Tuple[float, float]]:
+        # Arrange positions in a grid centered at 'center', filled row by row
         if count == 0:
             return []
         cols = math.ceil(math.sqrt(count))
         rows = math.ceil(count / cols)
-        positions = []
-        start_x = center[0] - (cols - 1) * spacing / 2
-        start_y = center[1] - (rows - 1) * spacing / 2
-        i = 0
-        for r in range(rows):
-            for c in range(cols):
-                if i >= count:
-                    break
-                x = start_x + c * spacing
-                y = start_y + r * spacing
-                positions.append((x, y))
-                i += 1
-        return positions
+        row_idx, col_idx = np.divmod(np.arange(count), cols)
+        xs = center[0] - (cols - 1) * spacing / 2 + col_idx * spacing
+        ys = center[1] - (rows - 1) * spacing / 2 + row_idx * spacing
+        return list(zip(xs.tolist(), ys.tolist()))
 
     def handle_mouse_click(self, pos: Tuple[int, int], button: int = 1):
         if button == 3 and self.selected_entities:
@@ -380,23 +405,22 @@ class GameEngine:
             for entity, dest in zip(self.selected_entities, positions):
                 entity.move_to(dest)
             return
+        # Convert screen coordinates to world coordinates
+        inv_zoom = 1.0 / self.zoom_level
+        world_x = (pos[0] - self.camera_x) * inv_zoom
+        world_y = (pos[1] - self.camera_y) * inv_zoom
         # Swordsman spawn mode
         if getattr(self, 'spawning_swordsman', False):
             try:
-                # Convert screen coordinates to world coordinates
-                world_x = (pos[0] - self.camera_x) / self.zoom_level
-                world_y = (pos[1] - self.camera_y) / self.zoom_level
-                
                 # Get clicked tile
                 tile = self.game_map.get_tile_at_screen_pos(world_x, world_y, self.zoom_level, self.camera_x, self.camera_y)
                 if tile:
-                    iso_x = (tile.x - tile.y) * 32
-                    iso_y = (tile.x + tile.y) * 16
+                    iso_x = (tile.x - tile.y) * _ISO_W
+                    iso_y = (tile.x + tile.y) * _ISO_H
                     print(f"[DEBUG] Spawning Swordsman at tile ({tile.x}, {tile.y}) -> iso ({iso_x}, {iso_y})")
                     swordsman = Unit(iso_x, iso_y, "Swordsman")
-                    self.entities.append(swordsman)
-                    self.units.append(swordsman)
-                    self.game_map.tiles[tile.y][tile.x].unit = swordsman
+                    self.add_entity(swordsman)
+                    self._occupy_tile(swordsman, tile.x, tile.y)
                 else:
                     print("[ERROR] No valid tile found for spawning Swordsman.")
             except Exception as e:
@@ -408,26 +432,19 @@ class GameEngine:
         else:
             # Building placement mode
             # Compute tile under mouse
-            world_x = (pos[0] - self.camera_x) / self.zoom_level
-            world_y = (pos[1] - self.camera_y) / self.zoom_level
             tile = self.game_map.get_tile_at_screen_pos(world_x, world_y, self.zoom_level, self.camera_x, self.camera_y)
             if self.placement_preview and self.building_to_place and tile:
                 preview = self.placement_preview
-                width = max(1, preview.width // 64)
-                height = max(1, preview.height // 64)
+                width = preview.tile_w
+                height = preview.tile_h
                 place_x = tile.x - (width // 2)
                 place_y = tile.y - (height // 2)
                 if button == 1:  # Left click to place
                     if self.game_map.can_build_at(place_x, place_y, width, height):
                         try:
                             building = Building(place_x, place_y, self.building_to_place, resource_manager=self.resource_manager)
-                            self.entities.append(building)
-                            self.buildings.append(building)
-                            for dy in range(height):
-                                for dx in range(width):
-                                    t = self.game_map.get_tile_at(place_x + dx, place_y + dy)
-                                    if t:
-                                        t.building = building
+                            self.add_entity(building)
+                            self._stamp_building(building, place_x, place_y)
                         except Exception as e:
                             print(f"Error placing building: {e}")
                         self.building_to_place = None
@@ -444,16 +461,9 @@ class GameEngine:
                 entity.selected = False
             self.selected_entities.clear()
             # Check if clicked on an entity
-            for entity in self.entities:
-                screen_x, screen_y = entity.get_screen_pos(self.zoom_level)
-                screen_x += self.camera_x
-                screen_y += self.camera_y
-                dx = pos[0] - screen_x
-                dy = pos[1] - screen_y
-                distance = (dx ** 2 + dy ** 2) ** 0.5
-                if distance < 20 * self.zoom_level:  # Selection radius
-                    self.selected_entities.append(entity)
-                    entity.selected = True
+            for entity in self._entities_at(pos):
+                self.selected_entities.append(entity)
+                entity.selected = True
             # (Right click selection logic is handled above)
             # (No nested try/except here)
 
@@ -463,162 +473,210 @@ class GameEngine:
                 self.spawning_swordsman = True
                 self.building_to_place = None
                 self.placement_preview = None
-            else:
+            elif building_type in ("Woodcutter", "Quarry", "Farm", "Barracks", "Archery"):
                 self.building_to_place = building_type
                 # Create a preview building
                 self.placement_preview = Building(0, 0, building_type)
+                self.spawning_swordsman = False
+            else:
+                self.building_to_place = None
+                self.placement_preview = None
+                self.spawning_swordsman = False
         except Exception as e:
             print(f"Error starting building placement: {e}")
             
     def update(self):
-        try:
-            if not self.paused:
-                # --- Enemy AI: make enemy units attack player units if close ---
-                for enemy in self.units:
-                    if getattr(enemy, 'team', 'player') == 'enemy':
-                        # Find nearest player unit
-                        min_dist = float('inf')
-                        target = None
-                        for unit in self.units:
-                            if getattr(unit, 'team', 'player') == 'player':
-                                dist = ((enemy.x - unit.x) ** 2 + (enemy.y - unit.y) ** 2) ** 0.5
-                                if dist < 400 and dist < min_dist:  # 400 px aggro range
-                                    min_dist = dist
-                                    target = unit
-                        if target:
-                            enemy.move_to((target.x, target.y))
-                # Handle keyboard input for camera movement
-                keys = pygame.key.get_pressed()
-                if keys[pygame.K_LEFT]:
-                    self.camera_x += self.CAMERA_SPEED / self.zoom_level
-                if keys[pygame.K_RIGHT]:
-                    self.camera_x -= self.CAMERA_SPEED / self.zoom_level
-                if keys[pygame.K_UP]:
-                    self.camera_y += self.CAMERA_SPEED / self.zoom_level
-                if keys[pygame.K_DOWN]:
-                    self.camera_y -= self.CAMERA_SPEED / self.zoom_level
-
-                # WASD unit movement for selected units
-                dx, dy = 0, 0
-                if keys[pygame.K_a]:
-                    dx -= 1
-                if keys[pygame.K_d]:
-                    dx += 1
-                if keys[pygame.K_w]:
-                    dy -= 1
-                if keys[pygame.K_s]:
-                    dy += 1
-                if dx != 0 or dy != 0:
-                    for entity in self.selected_entities:
-                        if hasattr(entity, 'speed'):
-                            norm = (dx ** 2 + dy ** 2) ** 0.5
-                            if norm == 0:
-                                continue
-                            move_x = (dx / norm) * entity.speed
-                            move_y = (dy / norm) * entity.speed
-                            entity.x += move_x
-                            entity.y += move_y
-                    
-                # Clamp camera position
-                self.clamp_camera_position()
+        if not self.paused:
+            # --- Enemy AI: make enemy units attack player units if close ---
+            self._update_ai()
+            # Handle keyboard input for camera movement
+            keys = pygame.key.get_pressed()
+            if keys[pygame.K_LEFT]:
+                self.camera_x += self.CAMERA_SPEED / self.zoom_level
+            if keys[pygame.K_RIGHT]:
+                self.camera_x -= self.CAMERA_SPEED / self.zoom_level
+            if keys[pygame.K_UP]:
+                self.camera_y += self.CAMERA_SPEED / self.zoom_level
+            if keys[pygame.K_DOWN]:
+                self.camera_y -= self.CAMERA_SPEED / self.zoom_level
+
+            # WASD unit movement for selected units
+            dx, dy = 0, 0
+            if keys[pygame.K_a]:
+                dx -= 1
+            if keys[pygame.K_d]:
+                dx += 1
+            if keys[pygame.K_w]:
+                dy -= 1
+            if keys[pygame.K_s]:
+                dy += 1
+            if dx != 0 or dy != 0:
+                # Normalize the direction once for all selected units
+                norm = (dx * dx + dy * dy) ** 0.5
+                step_x = dx / norm
+                step_y = dy / norm
+                for entity in self.selected_entities:
+                    # Only units the engine still tracks; dead ones have left the broad phase for good
+                    if isinstance(entity, Unit) and entity in self._unit_tree:
+                        entity.x += step_x * entity.speed
+                        entity.y += step_y * entity.speed
+                        # Keep the broad phase current so this tick's blocking and targeting queries see the move
+                        self._unit_tree.update(entity, entity.get_aabb())
+                        self._entity_grid.move(entity, entity.x, entity.y)
                 
-                # Update entities and handle unit collisions/attacks
-                all_units = [e for e in self.entities if isinstance(e, Unit)]
-                all_buildings = [e for e in self.entities if isinstance(e, Building)]
-                to_remove = []
-                to_remove_buildings = []
-                for entity in self.entities:
-                    if isinstance(entity, Unit):
-                        entity.all_buildings = all_buildings
-                        entity.update(all_units=all_units)
-                        if entity.health <= 0:
-                            to_remove.append(entity)
-                    elif isinstance(entity, Building):
-                        entity.update()
-                        if hasattr(entity, 'health') and entity.health <= 0:
-                            to_remove_buildings.append(entity)
-                    else:
-                        entity.update()
-                # Remove dead units
-                for dead in to_remove:
-                    if dead in self.entities:
-                        self.entities.remove(dead)
-                    if dead in self.units:
-                        self.units.remove(dead)
-                    # Remove from map tile if needed
-                    for row in self.game_map.tiles:
-                        for tile in row:
-                            if hasattr(tile, 'unit') and tile.unit is dead:
-                                tile.unit = None
-                # Remove destroyed buildings
-                for b in to_remove_buildings:
-                    if b in self.entities:
-                        self.entities.remove(b)
-                    if b in self.buildings:
-                        self.buildings.remove(b)
-                    # Optionally, remove from map tiles
-                    for row in self.game_map.tiles:
-                        for tile in row:
-                            if hasattr(tile, 'building') and tile.building is b:
-                                tile.building = None
-                    
-                # Update placement preview
-                if self.placement_preview:
-                    mouse_x, mouse_y = pygame.mouse.get_pos()
-                    world_x = (mouse_x - self.camera_x) / self.zoom_level
-                    world_y = (mouse_y - self.camera_y) / self.zoom_level
-                    tile = self.game_map.get_tile_at_screen_pos(world_x, world_y, self.zoom_level, self.camera_x, self.camera_y)
-                    if tile:
-                        self.placement_preview.x = tile.x
-                        self.placement_preview.y = tile.y
-
-            # Check win condition: all enemy swordsmen defeated
-            if not self.win_message_shown:
-                enemy_swordsmen = [u for u in self.units if getattr(u, 'unit_type', None) == 'Swordsman' and getattr(u, 'team', None) == 'enemy' and getattr(u, 'health', 0) > 0]
-                if len(enemy_swordsmen) == 0:
-                    self.win_message_shown = True
-        except Exception as e:
-            print(f"Error in update: {e}")
+            # Clamp camera position
+            self.clamp_camera_position()
+            
+            # Update entities and handle unit collisions/attacks
+            self._update_units()
+            self._update_buildings()
+            self.resource_manager.update()
+                
+            # Update placement preview
+            if self.placement_preview:
+                mouse_x, mouse_y = self._mouse_pos
+                world_x = (mouse_x - self.camera_x) / self.zoom_level
+                world_y = (mouse_y - self.camera_y) / self.zoom_level
+                tile = self.game_map.get_tile_at_screen_pos(world_x, world_y, self.zoom_level, self.camera_x, self.camera_y)
+                if tile:
+                    self.placement_preview.x = tile.x
+                    self.placement_preview.y = tile.y
+
+        # Check win condition: all enemy swordsmen defeated
+        if not self.win_message_shown:
+            enemy_swordsmen_left = any(u.unit_type == 'Swordsman' and u.health > 0 for u in self._enemy_units)
+            if not enemy_swordsmen_left:
+                self.win_message_shown = True
+                self._prepare_win_message()
+
+    def _prepare_win_message(self):
+        self._win_surface = self._win_font.render("You won!", True, (255, 215, 0)).convert_alpha()
+        self._win_rect = self._win_surface.get_rect(center=(self.screen.get_width() // 2, self.screen.get_height() // 2))
+        # Draw a semi-transparent background
+        self._win_overlay = pygame.Surface((self.screen.get_width(), self.screen.get_height()), pygame.SRCALPHA).convert_alpha()
+        self._win_overlay.fill((0, 0, 0, 180))
+
+    def _update_ai(self):
+        # Nothing to chase without player units
+        if not self._player_units:
+            return
+        for enemy in self._enemy_units:
+            # Find nearest player unit
+            target = self._entity_grid.query_nearest(enemy.x, enemy.y, AGGRO_RANGE, _is_player_unit)
+            if target:
+                enemy.move_to((target.x, target.y))
+
+    def _update_units(self):
+        units = self.units
+        to_remove = []
+        unit_tree = self._unit_tree
+        building_tree = self._building_tree
+        steps = self._unit_steps()
+        engaged = self._resolve_melee()
+        for unit, unit_engaged in zip(units, engaged):
+            unit.update(all_units=units, unit_tree=unit_tree, building_tree=building_tree, steps=steps, engaged=unit_engaged)
+            # Later units in this pass must see where this one moved to
+            unit_tree.update(unit, unit.get_aabb())
+            self._entity_grid.move(unit, unit.x, unit.y)
+            if unit.health <= 0:
+                to_remove.append(unit)
+        # Remove dead units
+        self.remove_entities(to_remove)
+        self._sync_unit_positions()
+
+    def _unit_steps(self) -> Dict[Unit, Optional[Tuple[float, float]]]:
+        # Next position of every unit with a move target, stepped in one vectorized pass.
+        # A unit's own position and target only change in its own update, so these stay valid for the tick
+        movers = [unit for unit in self.units if unit.target_pos]
+        if not movers:
+            return {}
+        pos = np.array([(unit.x, unit.y) for unit in movers], dtype=np.float64)
+        target = np.array([unit.target_pos for unit in movers], dtype=np.float64)
+        speed = np.array([unit.speed for unit in movers], dtype=np.float64)
+        next_pos, moving = step_towards(pos, target, speed)
+        return {unit: (tuple(p) if m else None) for unit, p, m in zip(movers, next_pos.tolist(), moving.tolist())}
+
+    def _resolve_melee(self) -> List[bool]:
+        # Apply this tick's unit-vs-unit damage for every pair at once; returns which units are fighting
+        units = self.units
+        if not units:
+            return []
+        pos = np.array([(unit.x, unit.y) for unit in units], dtype=np.float64)
+        is_enemy = np.array([unit.team == 'enemy' for unit in units], dtype=bool)
+        damage = np.array([unit.attack_damage for unit in units], dtype=np.float64)
+        taken, engaged = melee_damage(pos, is_enemy, damage, MELEE_RANGE)
+        for unit, amount in zip(units, taken.tolist()):
+            if amount:
+                unit.health -= amount
+        return engaged.tolist()
+
+    def _update_buildings(self):
+        # Buildings have no per-tick logic (production is integrated by the resource manager),
+        # so only destroyed ones need looking at
+        to_remove = [building for building in self.buildings if building.health <= 0]
+        # Remove destroyed buildings
+        self.remove_entities(to_remove)
             
     def render(self):
+        # Clear screen
+        self.screen.fill((0, 0, 0))
+        
+        # Screen bounds used for culling, taken once per frame
+        screen_rect = self.screen.get_rect()
+        
+        # Render map
+        self.game_map.render(self.screen, self.zoom_level, self.camera_x, self.camera_y, screen_rect)
+        
+        # Render entities: bodies in one batched blit, back to front, then overlays
+        drawn = self._visible_entities(screen_rect)
+        blit_list = []
+        for entity in drawn:
+            blit_args = entity.get_blit_args(self.zoom_level, self.camera_x, self.camera_y)
+            if blit_args:
+                blit_list.append(blit_args)
+        self.screen.blits(blit_list, doreturn=False)
+        # Overlays are pure draw calls, so the screen can stay locked across them (blits can't)
+        self.screen.lock()
         try:
-            # Clear screen
-            self.screen.fill((0, 0, 0))
-            
-            # Render map
-            self.game_map.render(self.screen, self.zoom_level, self.camera_x, self.camera_y)
-            
-            # Render entities
-            for entity in self.entities:
-                entity.render(self.screen, self.zoom_level, self.camera_x, self.camera_y)
-            # Render selection rectangle if dragging
-            if getattr(self, 'drag_selecting', False) and self.drag_start and self.drag_end:
-                x1, y1 = self.drag_start
-                x2, y2 = self.drag_end
-                rect = pygame.Rect(min(x1, x2), min(y1, y2), abs(x2 - x1), abs(y2 - y1))
-                pygame.draw.rect(self.screen, (0, 255, 0), rect, 2)
-            # Render placement preview
-            if self.placement_preview:
-                self.placement_preview.render(self.screen, self.zoom_level, self.camera_x, self.camera_y)
-            # Render UI
-            self.ui.render()
-
-            # Render win message if player won
-            if getattr(self, 'win_message_shown', False):
-                font = pygame.font.Font(None, 80)
-                text_surface = font.render("You won!", True, (255, 215, 0))
-                text_rect = text_surface.get_rect(center=(self.screen.get_width() // 2, self.screen.get_height() // 2))
-                # Draw a semi-transparent background
-                overlay = pygame.Surface((self.screen.get_width(), self.screen.get_height()), pygame.SRCALPHA)
-                overlay.fill((0, 0, 0, 180))
-                self.screen.blit(overlay, (0, 0))
-                self.screen.blit(text_surface, text_rect)
-            # Update display
-            pygame.display.flip()
-        except Exception as e:
-            print(f"Error in render: {e}")
+            for entity in drawn:
+                entity.render_overlay(self.screen, self.zoom_level, self.camera_x, self.camera_y)
+        finally:
+            self.screen.unlock()
+        # Render selection rectangle if dragging
+        if getattr(self, 'drag_selecting', False) and self.drag_start and self.drag_end:
+            x1, y1 = self.drag_start
+            x2, y2 = self.drag_end
+            rect = pygame.Rect(min(x1, x2), min(y1, y2), abs(x2 - x1), abs(y2 - y1))
+            pygame.draw.rect(self.screen, (0, 255, 0), rect, 2)
+        # Render placement preview
+        if self.placement_preview:
+            self.placement_preview.render(self.screen, self.zoom_level, self.camera_x, self.camera_y)
+        # Render UI
+        self.ui.render()
+
+        # Render win message if player won
+        if self.win_message_shown:
+            self.screen.blit(self._win_overlay, (0, 0))
+            self.screen.blit(self._win_surface, self._win_rect)
+        # Update display
+        pygame.display.flip()
             
-    def handle_drag_select(self, start, end):
+    def _visible_entities(self, screen_rect: pygame.Rect) -> List[Entity]:
+        # On-screen entities sorted back to front, culled with one vectorized bounds test
+        entities = self.entities
+        if not entities:
+            return []
+        # Positions at the current zoom, so the per-entity screen position cache is reused by the blits below
+        scaled = np.array([e.get_screen_pos(self.zoom_level) for e in entities], dtype=np.float32)
+        half = np.array([e.get_half_extent() for e in entities], dtype=np.float32) * self.zoom_level
+        screen_x = scaled[:, 0] + self.camera_x
+        screen_y = scaled[:, 1] + self.camera_y
+        visible = ((screen_x + half > screen_rect.left) & (screen_x - half < screen_rect.right)
+                   & (screen_y + half > screen_rect.top) & (screen_y - half < screen_rect.bottom))
+        order = np.argsort(scaled[:, 1], kind='stable')
+        return [entities[i] for i in order if visible[i]]
+
+    def handle_drag_select(self, start: Tuple[int, int], end: Tuple[int, int]):
         # Convert screen rectangle to world rectangle
         x1, y1 = start
         x2, y2 = end
@@ -630,15 +688,19 @@ class GameEngine:
         for entity in self.selected_entities:
             entity.selected = False
         self.selected_entities.clear()
-        # Select all units in rectangle
-        for entity in self.entities:
-            if isinstance(entity, Unit):
-                screen_x, screen_y = entity.get_screen_pos(self.zoom_level)
-                screen_x += self.camera_x
-                screen_y += self.camera_y
-                if left <= screen_x <= right and top <= screen_y <= bottom:
-                    entity.selected = True
-                    self.selected_entities.append(entity)
+        # Map the screen rectangle back to world space once, then test raw unit positions
+        inv_zoom = 1.0 / self.zoom_level
+        world_left = (left - self.camera_x) * inv_zoom
+        world_right = (right - self.camera_x) * inv_zoom
+        world_top = (top - self.camera_y) * inv_zoom
+        world_bottom = (bottom - self.camera_y) * inv_zoom
+        unit_x = self._unit_pos[:, 0]
+        unit_y = self._unit_pos[:, 1]
+        mask = (unit_x >= world_left) & (unit_x <= world_right) & (unit_y >= world_top) & (unit_y <= world_bottom)
+        for i in np.flatnonzero(mask):
+            unit = self._unit_refs[i]
+            unit.selected = True
+            self.selected_entities.append(unit)
 
     def run(self):
         try:
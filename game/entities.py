@@ -1,6 +1,27 @@
 import pygame
-from typing import Tuple, Optional, List
+import numpy as np
+from typing import Dict, Tuple, Optional, List
 from enum import Enum
+from .resources import ResourceType
+
+# Outline vertices at zoom 1, relative to the entity's screen position; the body sprites are drawn from these
+# 2x2 tiles (128x128): a larger hex/octagon
+_KEEP_OUTLINE = np.array([
+    (0, -64),    # Top
+    (64, -32),   # Top right
+    (64, 32),    # Bottom right
+    (0, 64),     # Bottom
+    (-64, 32),   # Bottom left
+    (-64, -32),  # Top left
+], dtype=np.float64)
+# Default building (1x1 tile)
+_BUILDING_OUTLINE = _KEEP_OUTLINE * 0.5
+# Unit triangle, 32px total
+_UNIT_OUTLINE = np.array([
+    (0, -16),    # Top
+    (16, 16),    # Bottom right
+    (-16, 16),   # Bottom left
+], dtype=np.float64)
 
 class EntityType(Enum):
     BUILDING = 1
@@ -15,48 +36,68 @@ class Entity:
         self.height = height
         self.selected = False
         
+        # Map tiles (tx, ty) pointing at this entity
+        self._occupied_tiles: List[Tuple[int, int]] = []
+        
         # Base screen position for oblique view
         self.base_screen_x = (x - y) * 32
         self.base_screen_y = (x + y) * 16
         
-        # Cache for screen positions at different zoom levels
-        self._screen_pos_cache = {}
+        # Screen position at the last zoom level asked for (zoom rarely changes)
+        self._screen_pos_zoom: Optional[float] = None
+        self._screen_pos = (0.0, 0.0)
         
     def get_screen_pos(self, zoom_level: float = 1.0) -> Tuple[float, float]:
         # Return cached position if available
-        if zoom_level in self._screen_pos_cache:
-            return self._screen_pos_cache[zoom_level]
+        if zoom_level == self._screen_pos_zoom:
+            return self._screen_pos
             
         pos = (
             self.base_screen_x * zoom_level,
             self.base_screen_y * zoom_level
         )
-        self._screen_pos_cache[zoom_level] = pos
+        self._screen_pos_zoom = zoom_level
+        self._screen_pos = pos
         return pos
         
     def update(self):
         pass
         
+    def get_blit_args(self, zoom_level: float = 1.0, camera_x: float = 0, camera_y: float = 0) -> Optional[Tuple[pygame.Surface, Tuple[float, float]]]:
+        # Pre-rendered body surface and its destination, None if the entity has no body sprite
+        return None
+        
+    def get_half_extent(self) -> float:
+        # Half the on-screen size at zoom 1, used by the engine to cull off-screen entities
+        return 20
+        
     def render(self, screen: pygame.Surface, zoom_level: float = 1.0, camera_x: float = 0, camera_y: float = 0):
+        blit_args = self.get_blit_args(zoom_level, camera_x, camera_y)
+        if blit_args:
+            screen.blit(*blit_args)
+        self.render_overlay(screen, zoom_level, camera_x, camera_y)
+        
+    def render_overlay(self, screen: pygame.Surface, zoom_level: float = 1.0, camera_x: float = 0, camera_y: float = 0):
+        # Drawn on top of the body sprites
         if self.selected:
             # Draw selection circle
             screen_x, screen_y = self.get_screen_pos(zoom_level)
             screen_x += camera_x
             screen_y += camera_y
-            
-            # Check if entity is visible on screen
-            screen_rect = screen.get_rect()
-            entity_rect = pygame.Rect(
-                screen_x - 20 * zoom_level,
-                screen_y - 20 * zoom_level,
-                40 * zoom_level,
-                40 * zoom_level
-            )
-            
-            if screen_rect.colliderect(entity_rect):
-                pygame.draw.circle(screen, (255, 255, 0), (int(screen_x), int(screen_y)), int(20 * zoom_level), 2)
+            pygame.draw.circle(screen, (255, 255, 0), (int(screen_x), int(screen_y)), int(20 * zoom_level), 2)
+
+# Resource produced by each producer building, and how much per tick (10 every 30 ticks)
+PRODUCER_RESOURCES = {
+    "Woodcutter": ResourceType.WOOD,
+    "Quarry": ResourceType.STONE,
+    "Farm": ResourceType.FOOD,
+}
+PRODUCER_RATE = 10 / 30.0
 
 class Building(Entity):
+    # Pre-rendered building sprites keyed by (half size in pixels, zoom_level)
+    _surface_cache: Dict[Tuple[int, float], pygame.Surface] = {}
+    
     def __init__(self, x: int, y: int, building_type: str, resource_manager=None):
         if building_type in ["Stonekeep", "EnemyStonekeep"]:
             super().__init__(x, y, 128, 128)  # 2x2 tiles (each tile 64x64)
@@ -65,104 +106,80 @@ class Building(Entity):
         else:
             super().__init__(x, y, 64, 64)
         self.building_type = building_type
+        # Enemy-owned buildings have 'enemy' in their type name
+        self.is_enemy = "enemy" in building_type.lower()
+        # Footprint in map tiles (each tile 64x64)
+        self.tile_w = max(1, self.width // 64)
+        self.tile_h = max(1, self.height // 64)
         self.health = 100
         self.max_health = 100
         self.production_rate = 0
-        self._points_cache = {}
-        self.resource_timer = 0  # Timer for resource production
         self.resource_manager = resource_manager
+        # Producers hand their output rate to the resource manager once instead of ticking a timer
+        produced = PRODUCER_RESOURCES.get(building_type)
+        if produced is not None and resource_manager:
+            self.production_rate = PRODUCER_RATE
+            resource_manager.add_production_rate(produced, PRODUCER_RATE)
         
-    def get_points(self, zoom_level: float = 1.0) -> List[Tuple[float, float]]:
-        # Return cached points if available
-        if zoom_level in self._points_cache:
-            return self._points_cache[zoom_level]
+    def get_aabb(self) -> Tuple[float, float, float, float]:
+        # Box units collide with and attack, in the same space as unit x/y
+        return (self.x, self.y, self.x + self.width, self.y + self.height)
         
-        screen_x, screen_y = self.get_screen_pos(zoom_level)
-        if self.building_type in ["Stonekeep", "EnemyStonekeep"]:
-            # 2x2 tiles (128x128): draw a larger hex/octagon
-            points = [
-                (screen_x, screen_y - 64 * zoom_level),          # Top
-                (screen_x + 64 * zoom_level, screen_y - 32 * zoom_level),     # Top right
-                (screen_x + 64 * zoom_level, screen_y + 32 * zoom_level),     # Bottom right
-                (screen_x, screen_y + 64 * zoom_level),          # Bottom
-                (screen_x - 64 * zoom_level, screen_y + 32 * zoom_level),     # Bottom left
-                (screen_x - 64 * zoom_level, screen_y - 32 * zoom_level),     # Top left
-            ]
-        else:
-            # Default building (1x1 tile)
-            points = [
-                (screen_x, screen_y - 32 * zoom_level),          # Top
-                (screen_x + 32 * zoom_level, screen_y - 16 * zoom_level),     # Top right
-                (screen_x + 32 * zoom_level, screen_y + 16 * zoom_level),     # Bottom right
-                (screen_x, screen_y + 32 * zoom_level),          # Bottom
-                (screen_x - 32 * zoom_level, screen_y + 16 * zoom_level),     # Bottom left
-                (screen_x - 32 * zoom_level, screen_y - 16 * zoom_level),     # Top left
-            ]
-        self._points_cache[zoom_level] = points
-        return points
+    def stop_production(self):
+        # Withdraw this building's output, e.g. once it has been destroyed
+        produced = PRODUCER_RESOURCES.get(self.building_type)
+        if produced is not None and self.resource_manager and self.production_rate:
+            self.resource_manager.add_production_rate(produced, -self.production_rate)
+            self.production_rate = 0
         
-    def update(self, dt=1):
-        # Resource gathering logic: every 30 seconds, add 10 resources
-        from game.resources import ResourceType
-        # Only produce if on a resource tile (handled by placement logic)
-        if self.building_type == "Woodcutter" and self.resource_manager:
-            self.resource_timer += dt
-            if self.resource_timer >= 30:
-                self.resource_manager.add_resource(ResourceType.WOOD, 10)
-                self.resource_timer = 0
-        elif self.building_type == "Quarry" and self.resource_manager:
-            self.resource_timer += dt
-            if self.resource_timer >= 30:
-                self.resource_manager.add_resource(ResourceType.STONE, 10)
-                self.resource_timer = 0
-        elif self.building_type == "Farm" and self.resource_manager:
-            self.resource_timer += dt
-            if self.resource_timer >= 30:
-                self.resource_manager.add_resource(ResourceType.FOOD, 10)
-                self.resource_timer = 0
-        # Call parent update if needed
-        super().update()
+    def _half_size(self) -> int:
+        # Stonekeeps are drawn as a 2x2 tile hexagon, everything else as 1x1
+        return 64 if self.building_type in ["Stonekeep", "EnemyStonekeep"] else 32
         
-    def render(self, screen: pygame.Surface, zoom_level: float = 1.0, camera_x: float = 0, camera_y: float = 0):
-        try:
-            # Get points and apply camera offset
-            points = self.get_points(zoom_level)
-            offset_points = [(x + camera_x, y + camera_y) for x, y in points]
-            
-            # Check if building is visible on screen
-            screen_rect = screen.get_rect()
-            building_rect = pygame.Rect(
-                min(x for x, _ in offset_points),
-                min(y for _, y in offset_points),
-                max(x for x, _ in offset_points) - min(x for x, _ in offset_points),
-                max(y for _, y in offset_points) - min(y for _, y in offset_points)
-            )
-            
-            if not screen_rect.colliderect(building_rect):
-                return
-                
-            # Draw building
+    def get_surface(self, zoom_level: float = 1.0) -> pygame.Surface:
+        half = self._half_size()
+        key = (half, zoom_level)
+        surface = Building._surface_cache.get(key)
+        if surface is None:
+            s = half * zoom_level
+            surface = pygame.Surface((int(2 * s) + 1, int(2 * s) + 1), pygame.SRCALPHA)
+            # Outline scaled to the zoom and moved so its centre sits in the middle of the surface
+            outline = _KEEP_OUTLINE if half == 64 else _BUILDING_OUTLINE
+            points = (outline * zoom_level + s).tolist()
             color = (139, 69, 19)  # Brown color for buildings
-            pygame.draw.polygon(screen, color, offset_points)
-            pygame.draw.polygon(screen, (0, 0, 0), offset_points, 1)
-            
-            # Draw health bar
-            screen_x, screen_y = self.get_screen_pos(zoom_level)
-            screen_x += camera_x
-            screen_y += camera_y
-            
-            health_width = (self.health / self.max_health) * 64 * zoom_level
-            health_x = screen_x - 32 * zoom_level
-            health_y = screen_y - 40 * zoom_level
-            pygame.draw.rect(screen, (255, 0, 0), (health_x, health_y, health_width, 5 * zoom_level))
-            
-            # Draw selection circle if selected
-            if self.selected:
-                pygame.draw.circle(screen, (255, 255, 0), (int(screen_x), int(screen_y)), int(20 * zoom_level), 2)
-        except Exception as e:
-            print(f"Error rendering building: {e}")
+            pygame.draw.polygon(surface, color, points)
+            pygame.draw.polygon(surface, (0, 0, 0), points, 1)
+            surface = surface.convert_alpha()
+            Building._surface_cache[key] = surface
+        return surface
+        
+    def get_blit_args(self, zoom_level: float = 1.0, camera_x: float = 0, camera_y: float = 0) -> Optional[Tuple[pygame.Surface, Tuple[float, float]]]:
+        screen_x, screen_y = self.get_screen_pos(zoom_level)
+        s = self._half_size() * zoom_level
+        return self.get_surface(zoom_level), (screen_x + camera_x - s, screen_y + camera_y - s)
+        
+    def get_half_extent(self) -> float:
+        return self._half_size()
+        
+    def render_overlay(self, screen: pygame.Surface, zoom_level: float = 1.0, camera_x: float = 0, camera_y: float = 0):
+        screen_x, screen_y = self.get_screen_pos(zoom_level)
+        screen_x += camera_x
+        screen_y += camera_y
+        
+        # Draw health bar
+        health_width = (self.health / self.max_health) * 64 * zoom_level
+        health_x = screen_x - 32 * zoom_level
+        health_y = screen_y - 40 * zoom_level
+        pygame.draw.rect(screen, (255, 0, 0), (health_x, health_y, health_width, 5 * zoom_level))
+        
+        # Draw selection circle if selected
+        if self.selected:
+            pygame.draw.circle(screen, (255, 255, 0), (int(screen_x), int(screen_y)), int(20 * zoom_level), 2)
 
 class Unit(Entity):
+    # Pre-rendered unit triangles keyed by (team, zoom_level)
+    _surface_cache: Dict[Tuple[str, float], pygame.Surface] = {}
+    
     def get_screen_pos(self, zoom_level: float = 1.0) -> Tuple[float, float]:
         # x and y are pixel coordinates for units
         return (self.x * zoom_level, self.y * zoom_level)
@@ -177,89 +194,83 @@ class Unit(Entity):
         self.attack_damage = 10
         self.attack_range = 50
         self.team = team  # "player" or "enemy"
-        # Cache for points at different zoom levels
-        self._points_cache = {}
+        # Buildings to attack and collide with; add_entity binds this once to the engine's live buildings list
+        self.all_buildings: List["Building"] = []
         
-    def get_points(self, zoom_level: float = 1.0) -> List[Tuple[float, float]]:
-        # Use pixel coordinates for the triangle, make it visible and centered on the unit
-        screen_x, screen_y = self.get_screen_pos(zoom_level)
-        size = 16 * zoom_level  # Half the triangle size (32px total)
-        points = [
-            (screen_x, screen_y - size),         # Top
-            (screen_x + size, screen_y + size),  # Bottom right
-            (screen_x - size, screen_y + size),  # Bottom left
-        ]
-        return points
+    def get_aabb(self) -> Tuple[float, float, float, float]:
+        # Units collide as points
+        return (self.x, self.y, self.x, self.y)
         
     def move_to(self, target_pos: Tuple[int, int]):
         print(f"[DEBUG] {self.unit_type} at ({self.x:.2f}, {self.y:.2f}) received move command to {target_pos}")
         self.target_pos = target_pos
         
-    def update(self, all_units=None):
+    def update(self, all_units=None, unit_tree=None, building_tree=None, steps=None, engaged=False):
+        # unit_tree/building_tree are broad-phase AABB trees; without them every unit and building is checked.
+        # steps maps moving units to their precomputed next position (None once within a step of the target).
+        # engaged tells whether the engine's melee pass found this unit fighting enemy units this tick;
+        # unit-vs-unit damage is only ever applied there
         if all_units is None:
             all_units = []
         unit_radius = 16  # units are drawn as triangles in a ~32x32 box
+        # Distances are compared squared, so no square roots in the per-pair checks
+        unit_radius2 = unit_radius * unit_radius
         # --- Attack logic (units) ---
-        attack_range = 30
-        did_attack_unit = False
-        for other in all_units:
-            if other is not self and getattr(other, 'team', None) != self.team:
-                dist = ((self.x - other.x) ** 2 + (self.y - other.y) ** 2) ** 0.5
-                if dist < attack_range:
-                    other.health -= self.attack_damage * 0.1  # Damage per frame
-                    self.health -= other.attack_damage * 0.05
-                    self.target_pos = None
-                    did_attack_unit = True
-                    # print(f"{self.unit_type} at ({self.x:.1f},{self.y:.1f}) attacks {other.unit_type} at ({other.x:.1f},{other.y:.1f})")
+        did_attack_unit = bool(engaged)
+        if did_attack_unit:
+            self.target_pos = None
         # --- Attack logic (buildings, use same collision as movement) ---
-        from .entities import Building
         did_attack_building = False
-        for building in [b for b in getattr(self, 'all_buildings', []) if isinstance(b, Building)]:
-            btype = getattr(building, 'building_type', "").lower()
-            # Consider building as enemy if player's unit and 'enemy' in type, or vice versa
-            if self.team == "player" and "enemy" in btype:
-                is_enemy_building = True
-            elif self.team == "enemy" and "enemy" not in btype:
-                is_enemy_building = True
-            else:
-                is_enemy_building = False
-            if is_enemy_building:
+        # One building lookup per tick, wide enough for this step's attack and blocking checks
+        if building_tree is not None:
+            reach = unit_radius + self.speed
+            nearby_buildings = building_tree.query((self.x - reach, self.y - reach, self.x + reach, self.y + reach))
+        else:
+            nearby_buildings = self.all_buildings
+        is_enemy_unit = self.team == "enemy"
+        for building in nearby_buildings:
+            # Player units attack enemy buildings and enemy units attack the rest
+            if building.is_enemy != is_enemy_unit:
                 bx, by = building.x, building.y
-                bw, bh = getattr(building, 'width', 64), getattr(building, 'height', 64)
+                bw, bh = building.width, building.height
                 closest_x = min(max(self.x, bx), bx + bw)
                 closest_y = min(max(self.y, by), by + bh)
-                dist = ((self.x - closest_x) ** 2 + (self.y - closest_y) ** 2) ** 0.5
-                if dist <= unit_radius:
+                dx = self.x - closest_x
+                dy = self.y - closest_y
+                if dx * dx + dy * dy <= unit_radius2:
                     building.health -= self.attack_damage * 0.08  # Damage per frame
                     self.target_pos = None
                     did_attack_building = True
                     # print(f"{self.unit_type} at ({self.x:.1f},{self.y:.1f}) attacks {building.building_type} at ({bx},{by})")
         # --- Prevent overlap with other units and buildings (block movement if collision would occur) ---
         if self.target_pos and not (did_attack_unit or did_attack_building):
-            dx = self.target_pos[0] - self.x
-            dy = self.target_pos[1] - self.y
-            distance = (dx ** 2 + dy ** 2) ** 0.5
-            if distance > self.speed:
-                next_x = self.x + (dx / distance) * self.speed
-                next_y = self.y + (dy / distance) * self.speed
+            step = steps.get(self) if steps is not None else self._step_towards_target()
+            if step is not None:
+                next_x, next_y = step
                 blocked = False
                 # Check collision with units
-                for other in all_units:
+                if unit_tree is not None:
+                    blocking_units = unit_tree.query((next_x - 28, next_y - 28, next_x + 28, next_y + 28))
+                else:
+                    blocking_units = all_units
+                for other in blocking_units:
                     if other is not self:
-                        dist = ((next_x - other.x) ** 2 + (next_y - other.y) ** 2) ** 0.5
-                        if dist < 28:  # min_dist
+                        dx = next_x - other.x
+                        dy = next_y - other.y
+                        if dx * dx + dy * dy < 28 * 28:  # min_dist
                             blocked = True
                             # print(f"Blocked by unit at {other.x},{other.y}")
                             break
                 # Check collision with buildings
                 if not blocked:
-                    for building in getattr(self, 'all_buildings', []):
+                    for building in nearby_buildings:
                         bx, by = building.x, building.y
-                        bw, bh = getattr(building, 'width', 64), getattr(building, 'height', 64)
+                        bw, bh = building.width, building.height
                         closest_x = min(max(next_x, bx), bx + bw)
                         closest_y = min(max(next_y, by), by + bh)
-                        dist = ((next_x - closest_x) ** 2 + (next_y - closest_y) ** 2) ** 0.5
-                        if dist < unit_radius:
+                        dx = next_x - closest_x
+                        dy = next_y - closest_y
+                        if dx * dx + dy * dy < unit_radius2:
                             blocked = True
                             # print(f"Blocked by building at {bx},{by}")
                             break
@@ -273,41 +284,50 @@ class Unit(Entity):
         # Clamp health
         self.health = max(0, self.health)
 
-    def render(self, screen: pygame.Surface, zoom_level: float = 1.0, camera_x: float = 0, camera_y: float = 0):
-        try:
-            # Get points and apply camera offset
-            points = self.get_points(zoom_level)
-            offset_points = [(x + camera_x, y + camera_y) for x, y in points]
-            
-            # Check if unit is visible on screen
-            screen_rect = screen.get_rect()
-            unit_rect = pygame.Rect(
-                min(x for x, _ in offset_points),
-                min(y for _, y in offset_points),
-                max(x for x, _ in offset_points) - min(x for x, _ in offset_points),
-                max(y for _, y in offset_points) - min(y for _, y in offset_points)
-            )
-            
-            if not screen_rect.colliderect(unit_rect):
-                return
-                
-            # Draw unit as a triangle
+    def _step_towards_target(self) -> Optional[Tuple[float, float]]:
+        # Position after one step towards target_pos, None if the target is within one step
+        dx = self.target_pos[0] - self.x
+        dy = self.target_pos[1] - self.y
+        dist2 = dx * dx + dy * dy
+        if dist2 > self.speed * self.speed:
+            # Only a real step needs the actual distance
+            distance = dist2 ** 0.5
+            return (self.x + (dx / distance) * self.speed, self.y + (dy / distance) * self.speed)
+        return None
+
+    def get_surface(self, zoom_level: float = 1.0) -> pygame.Surface:
+        key = (self.team, zoom_level)
+        surface = Unit._surface_cache.get(key)
+        if surface is None:
+            size = 16 * zoom_level  # Half the triangle size (32px total)
+            surface = pygame.Surface((int(2 * size) + 1, int(2 * size) + 1), pygame.SRCALPHA)
+            points = (_UNIT_OUTLINE * zoom_level + size).tolist()
             color = (0, 0, 255) if self.team == "player" else (255, 0, 0)  # Blue for player, red for enemy
-            pygame.draw.polygon(screen, color, offset_points)
-            pygame.draw.polygon(screen, (0, 0, 0), offset_points, 1)
-            
-            # Draw health bar
-            screen_x, screen_y = self.get_screen_pos(zoom_level)
-            screen_x += camera_x
-            screen_y += camera_y
-            
-            health_width = (self.health / self.max_health) * 24 * zoom_level
-            health_x = screen_x - 12 * zoom_level
-            health_y = screen_y - 20 * zoom_level
-            pygame.draw.rect(screen, (255, 0, 0), (health_x, health_y, health_width, 3 * zoom_level))
-            
-            # Draw selection circle if selected
-            if self.selected:
-                pygame.draw.circle(screen, (255, 255, 0), (int(screen_x), int(screen_y)), int(20 * zoom_level), 2)
-        except Exception as e:
-            print(f"Error rendering unit: {e}, x={self.x}, y={self.y}, type={type(self)}") 
\ No newline at end of file
+            pygame.draw.polygon(surface, color, points)
+            pygame.draw.polygon(surface, (0, 0, 0), points, 1)
+            surface = surface.convert_alpha()
+            Unit._surface_cache[key] = surface
+        return surface
+        
+    def get_blit_args(self, zoom_level: float = 1.0, camera_x: float = 0, camera_y: float = 0) -> Optional[Tuple[pygame.Surface, Tuple[float, float]]]:
+        screen_x, screen_y = self.get_screen_pos(zoom_level)
+        size = 16 * zoom_level
+        return self.get_surface(zoom_level), (screen_x + camera_x - size, screen_y + camera_y - size)
+        
+    def get_half_extent(self) -> float:
+        return 16
+        
+    def render_overlay(self, screen: pygame.Surface, zoom_level: float = 1.0, camera_x: float = 0, camera_y: float = 0):
+        screen_x, screen_y = self.get_screen_pos(zoom_level)
+        screen_x += camera_x
+        screen_y += camera_y
+        
+        # Draw health bar
+        health_width = (self.health / self.max_health) * 24 * zoom_level
+        health_x = screen_x - 12 * zoom_level
+        health_y = screen_y - 20 * zoom_level
+        pygame.draw.rect(screen, (255, 0, 0), (health_x, health_y, health_width, 3 * zoom_level))
+        
+        # Draw selection circle if selected
+        if self.selected:
+            pygame.draw.circle(screen, (255, 255, 0), (int(screen_x), int(screen_y)), int(20 * zoom_level), 2)
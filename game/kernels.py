@@ -0,0 +1,37 @@
+import numpy as np
+from typing import Tuple
+
+# Numeric kernels for the per-tick unit update, run over every unit at once with NumPy
+
+def step_towards(pos: np.ndarray, target: np.ndarray, speed: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # pos/target are (N, 2) float64, speed is (N,). Returns each unit's position after one
+    # speed-length step towards its target, and a mask of the units still more than one step away
+    delta = target - pos
+    dist2 = delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1]
+    moving = dist2 > speed * speed
+    # Units that have arrived keep their position and never divide by their (possibly zero) distance
+    distance = np.sqrt(dist2)
+    distance[~moving] = 1.0
+    next_pos = pos + (delta / distance[:, None]) * speed[:, None]
+    next_pos[~moving] = pos[~moving]
+    return next_pos, moving
+
+def melee_damage(pos: np.ndarray, is_enemy: np.ndarray, damage: np.ndarray, attack_range: float, block_size: int = 512) -> Tuple[np.ndarray, np.ndarray]:
+    # Pairwise melee between opposing units closer than attack_range. Each unit hits every enemy in range
+    # for 10% of its damage and takes 5% of that enemy's damage back. Returns the damage each unit takes
+    # and a mask of the units that are fighting. Rows go in blocks to bound the N x N temporaries
+    n = len(pos)
+    taken = np.zeros(n, dtype=np.float64)
+    engaged = np.zeros(n, dtype=bool)
+    range2 = attack_range * attack_range
+    hit_damage = damage * 0.1
+    recoil_damage = damage * 0.05
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        dx = pos[start:stop, 0, None] - pos[None, :, 0]
+        dy = pos[start:stop, 1, None] - pos[None, :, 1]
+        hit = (dx * dx + dy * dy < range2) & (is_enemy[start:stop, None] != is_enemy[None, :])
+        # Every pair fights both ways: the enemy's hit on us plus the recoil of our hit on it
+        taken[start:stop] = hit @ hit_damage + hit @ recoil_damage
+        engaged[start:stop] = hit.any(axis=1)
+    return taken, engaged
@@ -1,8 +1,14 @@
 import pygame
-import random
-from typing import List, Tuple, Optional
+import math
+import numpy as np
+from collections import deque
+from typing import Dict, List, Tuple, Optional
 from enum import Enum
 
+# Reciprocals of the isometric tile half-extents (32 x 16 pixels)
+_INV_ISO_W = 1 / 32.0
+_INV_ISO_H = 1 / 16.0
+
 class TileType(Enum):
     GRASS = 1
     WATER = 2
@@ -10,84 +16,98 @@ class TileType(Enum):
     MOUNTAIN = 4
     DIRT = 5  # Brown patch
 
+_TILE_COLORS = {
+    TileType.GRASS: (34, 139, 34),  # Forest green
+    TileType.WATER: (0, 0, 139),    # Dark blue
+    TileType.FOREST: (0, 100, 0),   # Dark green
+    TileType.MOUNTAIN: (139, 137, 137),  # Gray
+    TileType.DIRT: (139, 69, 19)    # Brown
+}
+
+# Tile diamond vertices at zoom 1, relative to the tile's screen position
+_DIAMOND = np.array([
+    (0, -16),  # Top
+    (32, 0),   # Right
+    (0, 16),   # Bottom
+    (-32, 0),  # Left
+], dtype=np.float64)
+
 class Tile:
+    # Terrain, resources and the building/unit on a map cell; GameMap generates terrain in scratch arrays
+    # Pre-rendered tile diamonds keyed by (tile_type, zoom_level)
+    _surface_cache: Dict[Tuple[TileType, float], pygame.Surface] = {}
+    
     def __init__(self, x: int, y: int, tile_type: TileType):
         self.x = x
         self.y = y
         self.tile_type = tile_type
         self.resource_amount = 0
         self.building = None
+        self.unit = None
         
         # Base screen position for oblique view
         self.base_screen_x = (x - y) * 32
         self.base_screen_y = (x + y) * 16
         
-        # Cache for points at different zoom levels
-        self._points_cache = {}
+        # Diamond points at the last zoom level asked for
+        self._points_zoom: Optional[float] = None
+        self._points: Optional[np.ndarray] = None
         
-    def get_points(self, zoom_level: float = 1.0) -> List[Tuple[float, float]]:
+    def get_points(self, zoom_level: float = 1.0) -> np.ndarray:
         # Return cached points if available
-        if zoom_level in self._points_cache:
-            return self._points_cache[zoom_level]
-        # Calculate scaled screen position
-        screen_x = self.base_screen_x * zoom_level
-        screen_y = self.base_screen_y * zoom_level
-        # Create 4-point diamond (isometric square)
-        points = [
-            (screen_x, screen_y - 16 * zoom_level),  # Top
-            (screen_x + 32 * zoom_level, screen_y),  # Right
-            (screen_x, screen_y + 16 * zoom_level),  # Bottom
-            (screen_x - 32 * zoom_level, screen_y),  # Left
-        ]
-        self._points_cache[zoom_level] = points
+        if zoom_level == self._points_zoom:
+            return self._points
+        # Scale the 4-point diamond (isometric square) and move it to the tile's screen position
+        points = _DIAMOND * zoom_level + (self.base_screen_x * zoom_level, self.base_screen_y * zoom_level)
+        self._points_zoom = zoom_level
+        self._points = points
         return points
         
-    def render(self, screen: pygame.Surface, zoom_level: float = 1.0, camera_x: float = 0, camera_y: float = 0):
-        try:
-            # Get scaled points
-            points = self.get_points(zoom_level)
-            # Apply camera offset
-            offset_points = [(int(x + camera_x), int(y + camera_y)) for x, y in points]
-            # Check if tile is visible on screen
-            screen_rect = screen.get_rect()
-            tile_rect = pygame.Rect(
-                int(min(x for x, _ in offset_points)),
-                int(min(y for _, y in offset_points)),
-                int(max(x for x, _ in offset_points) - min(x for x, _ in offset_points)),
-                int(max(y for _, y in offset_points) - min(y for _, y in offset_points))
-            )
-            if not screen_rect.colliderect(tile_rect):
-                return
-            colors = {
-                TileType.GRASS: (34, 139, 34),  # Forest green
-                TileType.WATER: (0, 0, 139),    # Dark blue
-                TileType.FOREST: (0, 100, 0),   # Dark green
-                TileType.MOUNTAIN: (139, 137, 137),  # Gray
-                TileType.DIRT: (139, 69, 19)    # Brown
-            }
+    @staticmethod
+    def get_surface(tile_type: TileType, zoom_level: float = 1.0) -> pygame.Surface:
+        key = (tile_type, zoom_level)
+        surface = Tile._surface_cache.get(key)
+        if surface is None:
+            half_w = 32 * zoom_level
+            half_h = 16 * zoom_level
+            surface = pygame.Surface((int(2 * half_w) + 1, int(2 * half_h) + 1), pygame.SRCALPHA)
+            points = [
+                (half_w, 0),               # Top
+                (2 * half_w, half_h),      # Right
+                (half_w, 2 * half_h),      # Bottom
+                (0, half_h),               # Left
+            ]
             # Draw tile diamond
-            pygame.draw.polygon(screen, colors[self.tile_type], offset_points)
-            pygame.draw.polygon(screen, (0, 0, 0), offset_points, 1)  # Grid lines
-
-            # No numbers displayed
-        except Exception as e:
-            print(f"Error rendering tile: {e}")
+            pygame.draw.polygon(surface, _TILE_COLORS[tile_type], points)
+            pygame.draw.polygon(surface, (0, 0, 0), points, 1)  # Grid lines
+            surface = surface.convert_alpha()
+            Tile._surface_cache[key] = surface
+        return surface
+        
+    def get_blit_args(self, zoom_level: float = 1.0, camera_x: float = 0, camera_y: float = 0) -> Tuple[pygame.Surface, Tuple[int, int]]:
+        # Top-left corner of the diamond's bounding box on screen
+        dest_x = int(self.base_screen_x * zoom_level + camera_x - 32 * zoom_level)
+        dest_y = int(self.base_screen_y * zoom_level + camera_y - 16 * zoom_level)
+        return Tile.get_surface(self.tile_type, zoom_level), (dest_x, dest_y)
+        
+    def render(self, screen: pygame.Surface, zoom_level: float = 1.0, camera_x: float = 0, camera_y: float = 0):
+        screen.blit(*self.get_blit_args(zoom_level, camera_x, camera_y))
 
 class GameMap:
     def __init__(self, width: int, height: int):
         self.width = width
         self.height = height
         self.tiles: List[List[Tile]] = []
+        # Visible (y, first x, last x) row spans for the last camera/zoom/screen size
+        self._visible_key = None
+        self._visible_rows: List[Tuple[int, int, int]] = []
         self.generate_map()
         
     def generate_map(self):
-        # Initialize empty map
-        self.tiles = [[None for _ in range(self.width)] for _ in range(self.height)]
-        
+        # Terrain is generated in an array indexed [y, x], then turned into Tiles, which own it from then on.
+        # All randomness comes from np.random, so seeding it reproduces the map
         # Step 1: Fill all with grass
-        for y in range(self.height):
-            for x in range(self.width):
-                self.tiles[y][x] = Tile(x, y, TileType.GRASS)
+        terrain = np.full((self.height, self.width), TileType.GRASS.value, dtype=np.uint8)
 
         # Step 2: Calculate how many water and mountain tiles are needed
         total_tiles = self.width * self.height
@@ -97,65 +117,73 @@ class GameMap:
         # Step 3: Place water patches further from the player's and enemy's stonekeeps
         avoid_centers = [(13, 13), (69, 5)]
         avoid_radius = 8
-        self._place_resource_patches(TileType.WATER, num_water, patch_size_range=(4, 12), avoid_center=avoid_centers, avoid_radius=avoid_radius)
+        self._place_resource_patches(terrain, TileType.WATER, num_water, patch_size_range=(4, 12), avoid_center=avoid_centers, avoid_radius=avoid_radius)
         # Step 4: Place mountain patches avoiding both stonekeeps
         avoid_centers = [(13, 13), (69, 5)]
         avoid_radius = 8
-        self._place_resource_patches(TileType.MOUNTAIN, num_mountain, patch_size_range=(4, 10), avoid_center=avoid_centers, avoid_radius=avoid_radius)
+        self._place_resource_patches(terrain, TileType.MOUNTAIN, num_mountain, patch_size_range=(4, 10), avoid_center=avoid_centers, avoid_radius=avoid_radius)
         # Step 4b: Place small dirt (brown) patches avoiding both stonekeeps
         num_dirt = int(total_tiles * 0.01)  # 1% of tiles
-        self._place_resource_patches(TileType.DIRT, num_dirt, patch_size_range=(2, 5), avoid_center=avoid_centers, avoid_radius=avoid_radius)
+        self._place_resource_patches(terrain, TileType.DIRT, num_dirt, patch_size_range=(2, 5), avoid_center=avoid_centers, avoid_radius=avoid_radius)
         # Step 5: Place forest tiles randomly (as before)
+        forest_mask = (terrain == TileType.GRASS.value) & (np.random.random((self.height, self.width)) < 0.075)
+        terrain[forest_mask] = TileType.FOREST.value
+
+        # Add resources to appropriate tiles
+        resource_amount = self.add_resources(terrain)
+        # Build the Tiles from the finished arrays
+        self._build_tiles(terrain, resource_amount)
+
+    def _build_tiles(self, terrain: np.ndarray, resource_amount: np.ndarray):
+        types_by_value = {t.value: t for t in TileType}
+        tile_types = terrain.tolist()
+        amounts = resource_amount.tolist()
+        self.tiles = []
         for y in range(self.height):
+            type_row = tile_types[y]
+            amount_row = amounts[y]
+            row = []
             for x in range(self.width):
-                if self.tiles[y][x].tile_type == TileType.GRASS and random.random() < 0.075:
-                    self.tiles[y][x].tile_type = TileType.FOREST
+                tile = Tile(x, y, types_by_value[type_row[x]])
+                tile.resource_amount = amount_row[x]
+                row.append(tile)
+            self.tiles.append(row)
 
-        # Add resources to appropriate tiles
-        self.add_resources()
+    def set_tile_type(self, x: int, y: int, tile_type: TileType):
+        # Change terrain after generation
+        self.tiles[y][x].tile_type = tile_type
 
-    def _place_resource_patches(self, tile_type, total_count, patch_size_range=(4, 10), avoid_center=None, avoid_radius=0):
+    def _place_resource_patches(self, terrain, tile_type, total_count, patch_size_range=(4, 10), avoid_center=None, avoid_radius=0):
+        # Tiles far enough from every avoid center, computed once with squared distances
+        allowed = np.ones((self.height, self.width), dtype=bool)
+        if avoid_center is not None and avoid_radius > 0:
+            centers = avoid_center if isinstance(avoid_center, list) else [avoid_center]
+            yy, xx = np.mgrid[:self.height, :self.width]
+            avoid_radius2 = avoid_radius * avoid_radius
+            for acx, acy in centers:
+                allowed &= (xx - acx) ** 2 + (yy - acy) ** 2 >= avoid_radius2
+        candidates = np.argwhere(allowed)
+        if len(candidates) == 0:
+            return
+        grass = TileType.GRASS.value
         placed = 0
         attempts = 0
         max_attempts = 1000
         while placed < total_count and attempts < max_attempts:
-            patch_size = random.randint(*patch_size_range)
-            patch_center_x = random.randint(0, self.width - 1)
-            patch_center_y = random.randint(0, self.height - 1)
-            # If avoid_center and avoid_radius are set, skip if too close
-            if avoid_center is not None and avoid_radius > 0:
-                centers = avoid_center if isinstance(avoid_center, list) else [avoid_center]
-                too_close = False
-                for acx, acy in centers:
-                    dist = ((patch_center_x - acx) ** 2 + (patch_center_y - acy) ** 2) ** 0.5
-                    if dist < avoid_radius:
-                        too_close = True
-                        break
-                if too_close:
-                    attempts += 1
-                    continue
+            patch_size = np.random.randint(patch_size_range[0], patch_size_range[1] + 1)
+            # Patch centers are only drawn from allowed tiles
+            patch_center_y, patch_center_x = candidates[np.random.randint(len(candidates))]
             patch_tiles = []
             # Use a simple BFS to fill the patch
-            queue = [(patch_center_x, patch_center_y)]
+            queue = deque([(int(patch_center_x), int(patch_center_y))])
             visited = set()
             while queue and len(patch_tiles) < patch_size:
-                cx, cy = queue.pop(0)
+                cx, cy = queue.popleft()
                 if (cx, cy) in visited:
                     continue
-                if 0 <= cx < self.width and 0 <= cy < self.height:
-                    # If avoid_center and avoid_radius are set, skip if too close
-                    if avoid_center is not None and avoid_radius > 0:
-                        centers = avoid_center if isinstance(avoid_center, list) else [avoid_center]
-                        too_close = False
-                        for acx, acy in centers:
-                            dist = ((cx - acx) ** 2 + (cy - acy) ** 2) ** 0.5
-                            if dist < avoid_radius:
-                                too_close = True
-                                break
-                        if too_close:
-                            continue
-                    if self.tiles[cy][cx].tile_type == TileType.GRASS:
-                        self.tiles[cy][cx].tile_type = tile_type
+                if 0 <= cx < self.width and 0 <= cy < self.height and allowed[cy, cx]:
+                    if terrain[cy, cx] == grass:
+                        terrain[cy, cx] = tile_type.value
                         patch_tiles.append((cx, cy))
                         placed += 1
                         if placed >= total_count:
@@ -168,13 +196,12 @@ class GameMap:
                 visited.add((cx, cy))
             attempts += 1
         
-    def add_resources(self):
-        # Add wood to forests
-        for y in range(self.height):
-            for x in range(self.width):
-                tile = self.tiles[y][x]
-                if tile.tile_type == TileType.FOREST:
-                    tile.resource_amount = random.randint(100, 500)
+    def add_resources(self, terrain: np.ndarray) -> np.ndarray:
+        # Resource amount per tile for the given terrain: wood in forests
+        resource_amount = np.zeros(terrain.shape, dtype=np.int32)
+        forest = terrain == TileType.FOREST.value
+        resource_amount[forest] = np.random.randint(100, 501, size=int(forest.sum()))
+        return resource_amount
                     
     def get_tile_at(self, x: int, y: int) -> Optional[Tile]:
         if 0 <= x < self.width and 0 <= y < self.height:
@@ -188,8 +215,10 @@ class GameMap:
             screen_y = (screen_y - camera_y) / zoom_level
             
             # Convert to tile coordinates
-            tile_x = int((screen_x / 32 + screen_y / 16) / 2)
-            tile_y = int((screen_y / 16 - screen_x / 32) / 2)
+            iso_x = screen_x * _INV_ISO_W
+            iso_y = screen_y * _INV_ISO_H
+            tile_x = int((iso_x + iso_y) * 0.5)
+            tile_y = int((iso_y - iso_x) * 0.5)
             
             return self.get_tile_at(tile_x, tile_y)
         except Exception as e:
@@ -197,29 +226,64 @@ class GameMap:
             return None
         
     def can_build_at(self, x: int, y: int, width: int = 1, height: int = 1) -> bool:
-        # Check all tiles covered by the building
-        for dy in range(height):
-            for dx in range(width):
-                tx, ty = x + dx, y + dy
-                tile = self.get_tile_at(tx, ty)
-                if not tile or tile.tile_type != TileType.GRASS or tile.building:
+        # Check all tiles covered by the building, bounds-checking the footprint once
+        if x < 0 or y < 0 or x + width > self.width or y + height > self.height:
+            return False
+        for row in self.tiles[y:y + height]:
+            for tile in row[x:x + width]:
+                if tile.tile_type != TileType.GRASS or tile.building:
                     return False
         return True
         
-    def render(self, screen: pygame.Surface, zoom_level: float = 1.0, camera_x: float = 0, camera_y: float = 0):
-        try:
-            # Render tiles with an extra border to always show upper and left edges
-            margin = 2  # Number of extra tiles to render outside the map on each side
-            for y in range(-margin, self.height):
-                for x in range(-margin, self.width):
-                    if 0 <= x < self.width and 0 <= y < self.height:
-                        self.tiles[y][x].render(screen, zoom_level, camera_x, camera_y)
-                    else:
-                        # Render an empty tile (e.g., black or a border color)
-                        # Optionally, you could skip this to just show the background
-                        pass
-        except Exception as e:
-            print(f"Error rendering map: {e}")
+    def stamp_building(self, building, x: int, y: int, width: int = 1, height: int = 1) -> List[Tuple[int, int]]:
+        # Point every in-bounds tile of the footprint at the building and return their coordinates
+        stamped = []
+        for ty in range(max(0, y), min(self.height, y + height)):
+            row = self.tiles[ty]
+            for tx in range(max(0, x), min(self.width, x + width)):
+                row[tx].building = building
+                stamped.append((tx, ty))
+        return stamped
+        
+    def get_visible_rows(self, screen_width: int, screen_height: int, zoom_level: float = 1.0, camera_x: float = 0, camera_y: float = 0) -> List[Tuple[int, int, int]]:
+        # Tile rows overlapping the screen as (y, first x, last x), found by inverting the iso projection
+        key = (screen_width, screen_height, zoom_level, camera_x, camera_y)
+        if key == self._visible_key:
+            return self._visible_rows
+        # A tile's centre is at u = x - y half-widths and v = x + y half-heights from the camera origin;
+        # widen by one tile so diamonds poking in from the edges are kept
+        inv_w = _INV_ISO_W / zoom_level
+        inv_h = _INV_ISO_H / zoom_level
+        u_min = math.floor(-camera_x * inv_w) - 1
+        u_max = math.ceil((screen_width - camera_x) * inv_w) + 1
+        v_min = math.floor(-camera_y * inv_h) - 1
+        v_max = math.ceil((screen_height - camera_y) * inv_h) + 1
+        rows = []
+        for y in range(max(0, (v_min - u_max) // 2), min(self.height, (v_max - u_min) // 2 + 1)):
+            first_x = max(0, u_min + y, v_min - y)
+            last_x = min(self.width - 1, u_max + y, v_max - y)
+            if first_x <= last_x:
+                rows.append((y, first_x, last_x))
+        self._visible_key = key
+        self._visible_rows = rows
+        return rows
+        
+    def render(self, screen: pygame.Surface, zoom_level: float = 1.0, camera_x: float = 0, camera_y: float = 0, screen_rect: Optional[pygame.Rect] = None):
+        # Render only the tiles that can be on screen, as one batch of pre-rendered diamonds
+        if screen_rect is None:
+            screen_rect = screen.get_rect()
+        screen_width, screen_height = screen_rect.size
+        surfaces = {tile_type: Tile.get_surface(tile_type, zoom_level) for tile_type in TileType}
+        half_w = 32 * zoom_level
+        half_h = 16 * zoom_level
+        tiles = self.tiles
+        blit_list = []
+        for y, first_x, last_x in self.get_visible_rows(screen_width, screen_height, zoom_level, camera_x, camera_y):
+            row = tiles[y]
+            for x in range(first_x, last_x + 1):
+                tile = row[x]
+                blit_list.append((surfaces[tile.tile_type], (int(tile.base_screen_x * zoom_level + camera_x - half_w), int(tile.base_screen_y * zoom_level + camera_y - half_h))))
+        screen.blits(blit_list, doreturn=False)
                 
     def get_walkable_neighbors(self, x: int, y: int) -> List[Tuple[int, int]]:
         neighbors = []
@@ -1,58 +1,90 @@
-from typing import Dict
-from enum import Enum
-
-class ResourceType(Enum):
-    GOLD = "gold"
-    WOOD = "wood"
-    STONE = "stone"
-    FOOD = "food"
-
-class ResourceManager:
-    def __init__(self):
-        self.resources: Dict[ResourceType, int] = {
-            ResourceType.GOLD: 1000,
-            ResourceType.WOOD: 500,
-            ResourceType.STONE: 500,
-            ResourceType.FOOD: 1000
-        }
-        
-        self.production_rates: Dict[ResourceType, float] = {
-            ResourceType.GOLD: 0,
-            ResourceType.WOOD: 0,
-            ResourceType.STONE: 0,
-            ResourceType.FOOD: 0
-        }
-        
-    def add_resource(self, resource_type: ResourceType, amount: int):
-        self.resources[resource_type] += amount
-        
-    def remove_resource(self, resource_type: ResourceType, amount: int) -> bool:
-        if self.resources[resource_type] >= amount:
-            self.resources[resource_type] -= amount
-            return True
-        return False
-        
-    def get_resource(self, resource_type: ResourceType) -> int:
-        return self.resources[resource_type]
-        
-    def set_production_rate(self, resource_type: ResourceType, rate: float):
-        self.production_rates[resource_type] = rate
-        
-    def update(self):
-        # Update resources based on production rates
-        for resource_type, rate in self.production_rates.items():
-            if rate > 0:
-                self.add_resource(resource_type, int(rate))
-                
-    def can_afford(self, costs: Dict[ResourceType, int]) -> bool:
-        for resource_type, cost in costs.items():
-            if self.resources[resource_type] < cost:
-                return False
-        return True
-        
-    def pay_costs(self, costs: Dict[ResourceType, int]) -> bool:
-        if self.can_afford(costs):
-            for resource_type, cost in costs.items():
-                self.remove_resource(resource_type, cost)
-            return True
+import numpy as np
+from typing import Callable, Dict, List
+from enum import Enum
+
+class ResourceType(Enum):
+    GOLD = "gold"
+    WOOD = "wood"
+    STONE = "stone"
+    FOOD = "food"
+
+# Position of each resource type in the production arrays
+_RESOURCE_INDEX = {resource_type: i for i, resource_type in enumerate(ResourceType)}
+
+class ResourceManager:
+    def __init__(self):
+        self.resources: Dict[ResourceType, int] = {
+            ResourceType.GOLD: 1000,
+            ResourceType.WOOD: 500,
+            ResourceType.STONE: 500,
+            ResourceType.FOOD: 1000
+        }
+        
+        self.production_rates: Dict[ResourceType, float] = {
+            ResourceType.GOLD: 0,
+            ResourceType.WOOD: 0,
+            ResourceType.STONE: 0,
+            ResourceType.FOOD: 0
+        }
+        
+        # Production per tick and the not yet paid out fractions, in ResourceType order
+        self._rates = np.zeros(len(ResourceType), dtype=np.float64)
+        self._accumulated = np.zeros(len(ResourceType), dtype=np.float64)
+        
+        # Called as listener(resource_type, new_amount) whenever an amount changes
+        self._listeners: List[Callable[[ResourceType, int], None]] = []
+        
+    def register_listener(self, callback: Callable[[ResourceType, int], None]):
+        self._listeners.append(callback)
+        
+    def _notify(self, resource_type: ResourceType):
+        amount = self.resources[resource_type]
+        for callback in self._listeners:
+            callback(resource_type, amount)
+        
+    def add_resource(self, resource_type: ResourceType, amount: int):
+        self.resources[resource_type] += amount
+        if amount:
+            self._notify(resource_type)
+        
+    def remove_resource(self, resource_type: ResourceType, amount: int) -> bool:
+        if self.resources[resource_type] >= amount:
+            self.resources[resource_type] -= amount
+            if amount:
+                self._notify(resource_type)
+            return True
+        return False
+        
+    def get_resource(self, resource_type: ResourceType) -> int:
+        return self.resources[resource_type]
+        
+    def set_production_rate(self, resource_type: ResourceType, rate: float):
+        self.production_rates[resource_type] = rate
+        self._rates[_RESOURCE_INDEX[resource_type]] = rate
+        
+    def add_production_rate(self, resource_type: ResourceType, delta: float):
+        # Used by producer buildings to register (or, with a negative delta, withdraw) their output
+        self.set_production_rate(resource_type, self.production_rates[resource_type] + delta)
+        
+    def update(self, dt: float = 1):
+        # Accumulate production (fractional rates included) and pay out whole units
+        self._accumulated += np.maximum(self._rates, 0) * dt
+        whole = np.floor(self._accumulated)
+        if whole.any():
+            self._accumulated -= whole
+            for resource_type, amount in zip(ResourceType, whole.tolist()):
+                if amount:
+                    self.add_resource(resource_type, int(amount))
+                
+    def can_afford(self, costs: Dict[ResourceType, int]) -> bool:
+        for resource_type, cost in costs.items():
+            if self.resources[resource_type] < cost:
+                return False
+        return True
+        
+    def pay_costs(self, costs: Dict[ResourceType, int]) -> bool:
+        if self.can_afford(costs):
+            for resource_type, cost in costs.items():
+                self.remove_resource(resource_type, cost)
+            return True
         return False 
\ No newline at end of file
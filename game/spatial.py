@@ -0,0 +1,126 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Offset added to cell coordinates so negative cells get a valid Morton code
+_MORTON_BIAS = 1 << 15
+
+def _part1by1(n: int) -> int:
+    # Spread the lower 16 bits of n so there is a zero bit between each of them
+    n &= 0x0000FFFF
+    n = (n | (n << 8)) & 0x00FF00FF
+    n = (n | (n << 4)) & 0x0F0F0F0F
+    n = (n | (n << 2)) & 0x33333333
+    n = (n | (n << 1)) & 0x55555555
+    return n
+
+def morton_code(cell_x: int, cell_y: int) -> int:
+    # Interleave cell x/y bits so neighbouring cells get nearby keys
+    return _part1by1(cell_x + _MORTON_BIAS) | (_part1by1(cell_y + _MORTON_BIAS) << 1)
+
+class SpatialGrid:
+    # Uniform grid over world positions with Morton-coded cells
+    def __init__(self, cell_size: int = 128):
+        self.cell_size = cell_size
+        self._cells: Dict[int, List[Any]] = {}
+        self._codes: Dict[Any, int] = {}
+        self._positions: Dict[Any, Tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, obj: Any, x: float, y: float):
+        code = morton_code(*self._cell(x, y))
+        self._codes[obj] = code
+        self._positions[obj] = (x, y)
+        self._cells.setdefault(code, []).append(obj)
+
+    def remove(self, obj: Any):
+        code = self._codes.pop(obj, None)
+        if code is None:
+            return
+        del self._positions[obj]
+        bucket = self._cells[code]
+        bucket.remove(obj)
+        if not bucket:
+            del self._cells[code]
+
+    def move(self, obj: Any, x: float, y: float):
+        # Only switch buckets when the object has crossed a cell border; objects not in the grid are ignored
+        old_code = self._codes.get(obj)
+        if old_code is None:
+            return
+        code = morton_code(*self._cell(x, y))
+        if code != old_code:
+            self.remove(obj)
+            self.insert(obj, x, y)
+        else:
+            self._positions[obj] = (x, y)
+
+    def query_rect(self, left: float, top: float, right: float, bottom: float) -> List[Any]:
+        # Objects inside the rectangle (edges inclusive)
+        left_cell, top_cell = self._cell(left, top)
+        right_cell, bottom_cell = self._cell(right, bottom)
+        found = []
+        for cy in range(top_cell, bottom_cell + 1):
+            for cx in range(left_cell, right_cell + 1):
+                for obj in self._cells.get(morton_code(cx, cy), ()):
+                    ox, oy = self._positions[obj]
+                    if left <= ox <= right and top <= oy <= bottom:
+                        found.append(obj)
+        return found
+
+    def query_radius(self, x: float, y: float, radius: float) -> List[Any]:
+        # Objects strictly closer than radius to (x, y), compared on squared distance
+        radius2 = radius * radius
+        left_cell, top_cell = self._cell(x - radius, y - radius)
+        right_cell, bottom_cell = self._cell(x + radius, y + radius)
+        positions = self._positions
+        found = []
+        for cy in range(top_cell, bottom_cell + 1):
+            for cx in range(left_cell, right_cell + 1):
+                for obj in self._cells.get(morton_code(cx, cy), ()):
+                    ox, oy = positions[obj]
+                    dx = ox - x
+                    dy = oy - y
+                    if dx * dx + dy * dy < radius2:
+                        found.append(obj)
+        return found
+
+    def query_nearest(self, x: float, y: float, radius: float, predicate: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+        # Nearest object closer than radius that passes predicate, searching rings of cells outwards
+        cell_x, cell_y = self._cell(x, y)
+        best = None
+        best_dist2 = radius * radius
+        max_ring = int(radius // self.cell_size) + 1
+        for ring in range(max_ring + 1):
+            # Everything in this ring is at least (ring - 1) cells away
+            ring_dist = (ring - 1) * self.cell_size
+            if ring_dist > 0 and ring_dist * ring_dist >= best_dist2:
+                break
+            for cx, cy in self._ring_cells(cell_x, cell_y, ring):
+                for obj in self._cells.get(morton_code(cx, cy), ()):
+                    if predicate is not None and not predicate(obj):
+                        continue
+                    ox, oy = self._positions[obj]
+                    dx = ox - x
+                    dy = oy - y
+                    dist2 = dx * dx + dy * dy
+                    if dist2 < best_dist2:
+                        best = obj
+                        best_dist2 = dist2
+        return best
+
+    @staticmethod
+    def _ring_cells(cell_x: int, cell_y: int, ring: int) -> List[Tuple[int, int]]:
+        if ring == 0:
+            return [(cell_x, cell_y)]
+        cells = []
+        for cx in range(cell_x - ring, cell_x + ring + 1):
+            cells.append((cx, cell_y - ring))
+            cells.append((cx, cell_y + ring))
+        for cy in range(cell_y - ring + 1, cell_y + ring):
+            cells.append((cell_x - ring, cy))
+            cells.append((cell_x + ring, cy))
+        return cells
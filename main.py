@@ -1,3 +1,4 @@
+import traceback
 from game.engine import GameEngine
 
 def main():
@@ -6,7 +7,6 @@ def main():
     game.run()
 
 if __name__ == "__main__":
-    import traceback
     try:
         main()
     except Exception as e: